@@ -1,36 +1,159 @@
 import requests
 import json
-from config import MEAL_DB_BASE_URL
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    MEAL_DB_BASE_URL, CACHE_TTL, HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR,
+    DETAILS_FANOUT_CONCURRENCY, RENDER_CACHE_MAX_ENTRIES, MESSAGE_CHUNK_SIZE
+)
+from cache import make_cache_key, LRUCache
+from models import Meal
+from singleflight import SingleFlight
+from metrics import UPSTREAM_SECONDS, UPSTREAM_ERRORS, RENDER_CACHE_LOOKUPS
 
 class TheMealDBClient:
     """Клиент для работы с TheMealDB API"""
     
-    def __init__(self):
+    def __init__(self, cache=None, pool_size=HTTP_POOL_SIZE, catalog=None):
         self.base_url = MEAL_DB_BASE_URL
+        self.cache = cache
+        self.catalog = catalog
+        self.timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        self.session = self._create_session(pool_size)
+        self._inflight = SingleFlight()
+    
+    @staticmethod
+    def _create_session(pool_size):
+        """Создает HTTP-сессию с пулом keep-alive соединений и повторами"""
+        retry = Retry(
+            total=HTTP_MAX_RETRIES,
+            connect=HTTP_MAX_RETRIES,
+            read=HTTP_MAX_RETRIES,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            backoff_factor=HTTP_BACKOFF_FACTOR,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry
+        )
+        
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def close(self):
+        """Закрывает HTTP-сессию и все соединения пула"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _get_json(self, endpoint, params=None):
+        """Выполняет GET-запрос к API, используя кэш для кэшируемых эндпоинтов"""
+        ttl = CACHE_TTL.get(endpoint)
+        if not ttl:
+            # Случайные рецепты не кэшируются и не объединяются
+            return self._fetch_json(endpoint, params)
+        
+        cache_key = make_cache_key(endpoint, params)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        # Одинаковые одновременные запросы ждут один общий ответ
+        return self._inflight.do(cache_key, self._fetch_and_cache, endpoint, params, cache_key, ttl)
+    
+    def _fetch_and_cache(self, endpoint, params, cache_key, ttl):
+        """Запрашивает данные у API и сохраняет их в кэш"""
+        data = self._fetch_json(endpoint, params)
+        if self.cache is not None:
+            self.cache.set(cache_key, data, ttl)
+        return data
+    
+    def _fetch_json(self, endpoint, params=None):
+        """Выполняет GET-запрос к API без кэша"""
+        url = f"{self.base_url}/{endpoint}"
+        try:
+            with UPSTREAM_SECONDS.time(endpoint=endpoint):
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            UPSTREAM_ERRORS.inc(endpoint=endpoint)
+            raise
+    
+    def _use_catalog(self):
+        """Можно ли отвечать из локального зеркала каталога"""
+        return self.catalog is not None and self.catalog.is_ready()
+    
+    def _search_catalog(self, method, *args):
+        """Результат поиска по зеркалу и признак, что ему можно верить
+        
+        Пустой ответ зеркала или неполное зеркало не значат, что рецептов
+        нет (рецепт мог появиться после синхронизации): тогда вызывающий
+        спрашивает API, а результат зеркала остается запасным.
+        """
+        if not self._use_catalog():
+            return [], False
+        meals = getattr(self.catalog, method)(*args)
+        return meals, bool(meals) and self.catalog.is_complete()
+    
+    def search_by_first_letter(self, letter):
+        """Рецепты на заданную букву напрямую из API (для синхронизации каталога)
+        
+        В отличие от остальных методов, ошибки сети пробрасываются вызывающему.
+        """
+        data = self._fetch_json("search.php", {"f": letter})
+        return Meal.from_api_list(data.get("meals"))
+    
+    def lookup_meal(self, meal_id):
+        """Рецепт по ID напрямую из API (для синхронизации каталога)
+        
+        В отличие от остальных методов, ошибки сети пробрасываются вызывающему.
+        """
+        data = self._fetch_json("lookup.php", {"i": meal_id})
+        meals = Meal.from_api_list(data.get("meals"))
+        return meals[0] if meals else None
     
     def search_meal_by_name(self, name):
         """Поиск рецепта по названию"""
+        local, trusted = self._search_catalog('search_by_name', name)
+        if trusted:
+            return local
+        
         try:
-            url = f"{self.base_url}/search.php"
-            params = {"s": name}
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get("meals", [])
+            data = self._get_json("search.php", {"s": name})
+            return Meal.from_api_list(data.get("meals")) or local
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при поиске по названию: {e}")
-            return []
+            return local
+    
+    def fuzzy_search_meal_by_name(self, name):
+        """Нечеткий поиск по названию (опечатки, начала слов)
+        
+        Работает только по локальному зеркалу каталога, без него
+        возвращает пустой список.
+        """
+        if self._use_catalog():
+            return self.catalog.fuzzy_search_by_name(name)
+        return []
     
     def get_random_meal(self):
         """Получить случайный рецепт"""
         try:
-            url = f"{self.base_url}/random.php"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            meals = data.get("meals", [])
+            data = self._get_json("random.php")
+            meals = Meal.from_api_list(data.get("meals"))
             return meals[0] if meals else None
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при получении случайного рецепта: {e}")
@@ -38,28 +161,53 @@ class TheMealDBClient:
     
     def search_by_ingredient(self, ingredient):
         """Поиск рецептов по ингредиенту"""
+        local, trusted = self._search_catalog('search_by_ingredient', ingredient)
+        if trusted:
+            return local
+        
         try:
-            url = f"{self.base_url}/filter.php"
-            params = {"i": ingredient}
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get("meals", [])
+            data = self._get_json("filter.php", {"i": ingredient})
+            return Meal.from_api_list(data.get("meals")) or local
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при поиске по ингредиенту: {e}")
-            return []
+            return local
+    
+    def search_by_ingredients(self, ingredients, match_all=True):
+        """Поиск рецептов сразу по нескольким ингредиентам
+        
+        При match_all=True рецепт должен содержать все ингредиенты, иначе
+        хотя бы один. Без локального зеркала результаты filter.php по каждому
+        ингредиенту объединяются и ранжируются по числу совпадений.
+        """
+        local, trusted = self._search_catalog('search_by_ingredients', ingredients, match_all)
+        if trusted:
+            return local
+        
+        counts = {}
+        meals_by_id = {}
+        for ingredient in ingredients:
+            for meal in self.search_by_ingredient(ingredient) or []:
+                meals_by_id[meal.id] = meal
+                counts[meal.id] = counts.get(meal.id, 0) + 1
+        
+        required = len(ingredients) if match_all else 1
+        ranked = sorted(
+            (meal_id for meal_id, count in counts.items() if count >= required),
+            key=lambda meal_id: -counts[meal_id]
+        )
+        return [meals_by_id[meal_id] for meal_id in ranked] or local
     
     def get_meal_details(self, meal_id):
         """Получить детальную информацию о рецепте по ID"""
+        if self._use_catalog():
+            meal = self.catalog.get_meal(meal_id)
+            if meal:
+                return meal
+        
+        # Рецепта нет в зеркале (например, он новый) - запрашиваем API
         try:
-            url = f"{self.base_url}/lookup.php"
-            params = {"i": meal_id}
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            meals = data.get("meals", [])
+            data = self._get_json("lookup.php", {"i": meal_id})
+            meals = Meal.from_api_list(data.get("meals"))
             return meals[0] if meals else None
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при получении деталей рецепта: {e}")
@@ -68,11 +216,7 @@ class TheMealDBClient:
     def get_categories(self):
         """Получить список категорий блюд"""
         try:
-            url = f"{self.base_url}/categories.php"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json("categories.php")
             return data.get("categories", [])
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при получении категорий: {e}")
@@ -80,117 +224,174 @@ class TheMealDBClient:
     
     def filter_by_category(self, category):
         """Поиск рецептов по категории"""
+        local, trusted = self._search_catalog('filter_by_category', category)
+        if trusted:
+            return local
+        
         try:
-            url = f"{self.base_url}/filter.php"
-            params = {"c": category}
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get("meals", [])
+            data = self._get_json("filter.php", {"c": category})
+            return Meal.from_api_list(data.get("meals")) or local
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при поиске по категории: {e}")
-            return []
+            return local
+
+class MealEnricher:
+    """Параллельная догрузка деталей рецептов через синхронный клиент
+    
+    Запросы выполняются в постоянном пуле потоков, поэтому общий пул
+    соединений и кэш клиента используются и здесь. Потоки не создаются
+    на каждый запрос: у каждого потока свое соединение SQLite.
+    """
+    
+    def __init__(self, client, max_concurrency=DETAILS_FANOUT_CONCURRENCY):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix='mealdb')
+    
+    def close(self):
+        """Останавливает потоки запросов"""
+        self._executor.shutdown(wait=False)
+    
+    def enrich_meals(self, meals):
+        """Заменяет краткие записи filter.php полными рецептами
+        
+        Детали запрашиваются параллельно, порядок сохраняется. Если детали
+        рецепта получить не удалось, остается исходная краткая запись.
+        """
+        if not meals:
+            return meals
+        
+        meal_ids = [meal.id for meal in meals]
+        details = self._executor.map(self.client.get_meal_details, meal_ids)
+        return [full or short for short, full in zip(meals, details)]
+
+# Готовые тексты рецепта: карточка, полный рецепт, полный рецепт частями
+# по MESSAGE_CHUNK_SIZE символов и раскладка кнопок карточки
+RenderedRecipe = namedtuple('RenderedRecipe', [
+    'card_text', 'image_url', 'full_text', 'full_chunks', 'card_keyboard'
+])
 
 class RecipeFormatter:
     """Класс для форматирования рецептов"""
     
+    # Версия шаблонов: при изменении текстов карточек ее нужно увеличить
+    TEMPLATE = 'v1'
+    
+    # Кэш отрисованных рецептов: (шаблон, id) -> (отпечаток данных, RenderedRecipe)
+    _render_cache = LRUCache(RENDER_CACHE_MAX_ENTRIES)
+    
     @staticmethod
-    def format_recipe_card(meal):
-        """Форматирует рецепт для отображения в виде карточки"""
-        if not meal:
-            return "❌ Рецепт не найден"
-        
-        # Основная информация
-        name = meal.get('strMeal', 'Неизвестное блюдо')
-        category = meal.get('strCategory', 'Без категории')
-        area = meal.get('strArea', 'Неизвестная кухня')
-        image = meal.get('strMealThumb', '')
-        video_url = meal.get('strYoutube', '')
+    def render(meal, template=TEMPLATE):
+        """Все тексты рецепта; повторные вызовы берутся из кэша
         
-        # Формируем текст
-        text = f"🍽️ **{name}**\n\n"
-        text += f"📂 Категория: {category}\n"
-        text += f"🌍 Кухня: {area}\n\n"
+        Запись кэша сверяется с отпечатком данных рецепта, поэтому после
+        изменения рецепта в TheMealDB тексты формируются заново.
+        """
+        meal = Meal.coerce(meal)
+        meal_id = meal.id
+        fingerprint = meal.fingerprint()
+        key = (template, meal_id)
         
-        # Ингредиенты
-        ingredients = RecipeFormatter.extract_ingredients(meal)
-        if ingredients:
-            text += "📋 **Ингредиенты:**\n"
-            for ingredient in ingredients[:8]:  # Показываем первые 8 ингредиентов
-                text += f"• {ingredient}\n"
-            
-            if len(ingredients) > 8:
-                text += f"• ... и еще {len(ingredients) - 8} ингредиентов\n"
+        if meal_id:
+            entry = RecipeFormatter._render_cache.get(key)
+            if entry is not None and entry[0][0] == fingerprint:
+                RENDER_CACHE_LOOKUPS.inc(result='hit')
+                return entry[0][1]
         
-        # Видеорецепт (только если есть)
-        if video_url and video_url.strip():
-            text += "\n🎥 **Видеорецепт:**\n"
-            text += f"📺 {video_url}"
-        
-        return text, image
+        RENDER_CACHE_LOOKUPS.inc(result='miss')
+        rendered = RecipeFormatter._render(meal)
+        if meal_id:
+            RecipeFormatter._render_cache.set(key, (fingerprint, rendered), float('inf'))
+        return rendered
     
     @staticmethod
-    def format_full_recipe(meal):
-        """Форматирует полный рецепт с инструкциями"""
-        if not meal:
-            return "❌ Рецепт не найден"
+    def _render(meal):
+        name = meal.name or 'Неизвестное блюдо'
+        category = meal.category or 'Без категории'
+        area = meal.area or 'Неизвестная кухня'
+        image = meal.thumb or ''
+        instructions = meal.instructions or 'Инструкции недоступны'
+        video_url = meal.youtube
+        ingredients = RecipeFormatter.extract_ingredients(meal)
         
-        name = meal.get('strMeal', 'Неизвестное блюдо')
-        category = meal.get('strCategory', 'Без категории')
-        area = meal.get('strArea', 'Неизвестная кухня')
-        instructions = meal.get('strInstructions', 'Инструкции недоступны')
-        video_url = meal.get('strYoutube', '')
+        header = f"🍽️ **{name}**\n\n📂 Категория: {category}\n🌍 Кухня: {area}\n\n"
+        video = f"🎥 **Видеорецепт:**\n📺 {video_url}" if video_url else ""
         
-        text = f"🍽️ **{name}**\n\n"
-        text += f"📂 Категория: {category}\n"
-        text += f"🌍 Кухня: {area}\n\n"
+        # Карточка
+        card = [header]
+        if ingredients:
+            card.append("📋 **Ингредиенты:**\n")
+            card.extend(f"• {ingredient}\n" for ingredient in ingredients[:8])  # Показываем первые 8 ингредиентов
+            if len(ingredients) > 8:
+                card.append(f"• ... и еще {len(ingredients) - 8} ингредиентов\n")
+        if video:
+            card.append("\n" + video)
         
-        # Ингредиенты
-        ingredients = RecipeFormatter.extract_ingredients(meal)
+        # Полный рецепт
+        full = [header]
         if ingredients:
-            text += "📋 **Ингредиенты:**\n"
-            for ingredient in ingredients:
-                text += f"• {ingredient}\n"
-            text += "\n"
+            full.append("📋 **Ингредиенты:**\n")
+            full.extend(f"• {ingredient}\n" for ingredient in ingredients)
+            full.append("\n")
         
         # Инструкции (ограничиваем длину)
-        text += "👨‍🍳 **Приготовление:**\n"
+        full.append("👨‍🍳 **Приготовление:**\n")
         if len(instructions) > 800:
-            text += instructions[:800] + "...\n\n"
-            text += "📖 *Полные инструкции слишком длинные для отображения*"
+            full.append(instructions[:800] + "...\n\n")
+            full.append("📖 *Полные инструкции слишком длинные для отображения*")
         else:
-            text += instructions
+            full.append(instructions)
+        if video:
+            full.append("\n\n" + video)
         
-        # Видеорецепт
-        if video_url and video_url.strip():
-            text += "\n\n🎥 **Видеорецепт:**\n"
-            text += f"📺 {video_url}"
+        full_text = "".join(full)
+        meal_id = meal.id
         
-        return text
+        return RenderedRecipe(
+            card_text="".join(card),
+            image_url=image,
+            full_text=full_text,
+            full_chunks=RecipeFormatter.split_text(full_text),
+            card_keyboard=((
+                ("📖 Подробнее", ("recipe_details", meal_id)),
+                ("⭐ Сохранить", ("save_recipe", meal_id)),
+            ),)
+        )
     
     @staticmethod
-    def extract_ingredients(meal):
-        """Извлекает список ингредиентов из рецепта"""
-        ingredients = []
+    def split_text(text, size=MESSAGE_CHUNK_SIZE):
+        """Делит длинный текст на части, которые помещаются в одно сообщение"""
+        return tuple(text[i:i + size] for i in range(0, len(text), size)) or ("",)
+    
+    @staticmethod
+    def format_recipe_card(meal):
+        """Форматирует рецепт для отображения в виде карточки"""
+        if not meal:
+            return "❌ Рецепт не найден"
         
-        for i in range(1, 21):  # API возвращает до 20 ингредиентов
-            ingredient_key = f'strIngredient{i}'
-            measure_key = f'strMeasure{i}'
-            
-            ingredient = meal.get(ingredient_key, '')
-            measure = meal.get(measure_key, '')
-            
-            # Проверяем, что значения не None и не пустые
-            if ingredient and ingredient.strip():
-                ingredient = ingredient.strip()
-                if measure and measure.strip():
-                    measure = measure.strip()
-                    ingredients.append(f"{measure} {ingredient}")
-                else:
-                    ingredients.append(ingredient)
+        rendered = RecipeFormatter.render(meal)
+        return rendered.card_text, rendered.image_url
+    
+    @staticmethod
+    def format_full_recipe(meal):
+        """Форматирует полный рецепт с инструкциями"""
+        if not meal:
+            return "❌ Рецепт не найден"
         
-        return ingredients
+        return RecipeFormatter.render(meal).full_text
+    
+    @staticmethod
+    def extract_ingredients(meal):
+        """Извлекает список ингредиентов из рецепта"""
+        return [
+            f"{measure} {ingredient}" if measure else ingredient
+            for ingredient, measure in Meal.coerce(meal).ingredients
+        ]
+    
+    @staticmethod
+    def extract_ingredient_pairs(meal):
+        """Извлекает пары (ингредиент, мера) из рецепта"""
+        return list(Meal.coerce(meal).ingredients)
     
     @staticmethod
     def format_recipe_list(meals, title="🔍 Результаты поиска"):
@@ -201,8 +402,9 @@ class RecipeFormatter:
         text = f"{title}\n\n"
         
         for i, meal in enumerate(meals[:10], 1):  # Показываем до 10 рецептов
-            name = meal.get('strMeal', 'Неизвестное блюдо')
-            category = meal.get('strCategory', '')
+            meal = Meal.coerce(meal)
+            name = meal.name or 'Неизвестное блюдо'
+            category = meal.category or ''
             
             text += f"{i}. **{name}**"
             if category:
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Сквозной нагрузочный тест бота с локальными TheMealDB и Telegram
+
+Запуск из корня проекта:
+    python -m benchmarks.e2e [--users 20] [--sessions 10] [--upstream-latency 0.05]
+    python -m benchmarks.e2e --save-baseline    # сохранить результат как эталон
+
+Бот импортируется целиком, но обращается к FakeMealDB и FakeTelegram и
+работает с временной базой данных. Синтетические пользователи проходят
+сценарии (поиск, категории, подробности, избранное, оценки): обновления
+Telegram подаются в bot.process_new_updates и проходят через диспетчер
+обновлений и очередь отправки, как в работающем боте. Время шага - от
+подачи обновления до конца его обработки. В отчете - обновлений в
+секунду, p50/p95/p99 по шагам и методам базы данных и сравнение с
+эталоном (benchmarks/e2e_baseline.json): при регрессии скрипт завершается
+с кодом 1.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from benchmarks.fakes import FakeMealDB, FakeTelegram, CATEGORIES, INGREDIENTS
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'e2e_baseline.json')
+
+# Допустимое ухудшение относительно эталона
+DEFAULT_TOLERANCE = 0.2
+# Изменения p95 меньше этого порога (в секундах) считаются шумом
+MIN_LATENCY_DELTA = 0.002
+# p95 по меньшему числу вызовов - почти максимум, его не сравниваем
+MIN_SAMPLES = 100
+
+
+class LatencyStats:
+    """Потокобезопасный сбор длительностей по меткам"""
+
+    def __init__(self):
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, label, seconds):
+        with self._lock:
+            self._samples[label].append(seconds)
+
+    def summary(self):
+        """Количество и перцентили (в секундах) по каждой метке"""
+        with self._lock:
+            samples = {label: sorted(values) for label, values in self._samples.items()}
+        return {
+            label: {
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+            }
+            for label, values in sorted(samples.items())
+        }
+
+
+def percentile(sorted_values, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def instrument_database(db, stats):
+    """Оборачивает публичные методы RecipeDatabase замером времени"""
+    for name in dir(db):
+        method = getattr(db, name)
+        if name.startswith('_') or not callable(method):
+            continue
+
+        def timed(*args, _method=method, _label=f"db.{name}", **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                stats.add(_label, time.perf_counter() - start)
+
+        setattr(db, name, wraps(method)(timed))
+
+
+def scenario_steps(rng, meals, encode):
+    """Случайный сценарий пользователя: список (метка, тип, данные)
+
+    encode(маршрут, *аргументы) строит callback_data так же, как кнопки бота.
+    """
+    meal = rng.choice(meals)
+    meal_id = meal['idMeal']
+    scenarios = [
+        [('text:menu', 'text', 'привет'),
+         ('callback:search_recipes', 'callback', 'search_recipes'),
+         ('callback:back_to_main', 'callback', 'back_to_main')],
+        [('callback:search_by_name', 'callback', 'search_by_name'),
+         ('text:search_name', 'text', meal['strMeal'].split()[-1])],
+        [('callback:search_by_ingredient', 'callback', 'search_by_ingredient'),
+         ('text:search_ingredient', 'text', ', '.join(rng.sample(INGREDIENTS, rng.randint(1, 2))))],
+        [('callback:search_by_category', 'callback', 'search_by_category'),
+         ('callback:category', 'callback', encode('category', rng.choice(CATEGORIES)))],
+        [('callback:recipe_details', 'callback', encode('recipe_details', meal_id)),
+         ('callback:save_recipe', 'callback', encode('save_recipe', meal_id))],
+        [('callback:save_recipe', 'callback', encode('save_recipe', meal_id)),
+         ('callback:my_recipes', 'callback', 'my_recipes'),
+         ('callback:fav_details', 'callback', encode('fav_details', meal_id)),
+         ('callback:rate_recipe', 'callback', encode('rate_recipe', meal_id)),
+         ('callback:set_rating', 'callback', encode('set_rating', meal_id, rng.randint(1, 5)))],
+        [('callback:view_list', 'callback', 'view_list'),
+         ('callback:view_cards', 'callback', 'view_cards')],
+        [('callback:search_random', 'callback', 'search_random')],
+    ]
+    return rng.choice(scenarios)
+
+
+class LoadGenerator:
+    """Синтетические пользователи, каждый в своем потоке"""
+
+    def __init__(self, bot_module, meals, stats, users, sessions, seed):
+        self.bot_module = bot_module
+        self.meals = meals
+        self.stats = stats
+        self.users = users
+        self.sessions = sessions
+        self.seed = seed
+        self.updates = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._update_ids = iter(range(1, 1 << 62))
+        self._waiting = {}  # update_id -> Event, который ставится после обработки
+
+    def install(self):
+        """Отмечает окончание обработки каждого обновления в диспетчере бота"""
+        dispatcher = self.bot_module.bot.dispatcher
+        handler = dispatcher.handler
+
+        def traced(update):
+            try:
+                handler(update)
+            except Exception as e:
+                print(f"❌ Обновление {update.update_id}: {e}")
+                with self._lock:
+                    self.errors += 1
+            finally:
+                with self._lock:
+                    done = self._waiting.pop(update.update_id, None)
+                if done is not None:
+                    done.set()
+
+        dispatcher.handler = traced
+        return self
+
+    def run(self):
+        """Прогоняет всех пользователей и возвращает длительность в секундах"""
+        threads = [
+            threading.Thread(target=self._run_user, args=(number,), daemon=True)
+            for number in range(self.users)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def _run_user(self, number):
+        rng = random.Random(self.seed * 100_003 + number)
+        chat_id = 700_000 + number
+        for _ in range(self.sessions):
+            for label, kind, payload in scenario_steps(rng, self.meals, self.bot_module.callback_router.encode):
+                self._step(chat_id, label, kind, payload)
+
+    def _step(self, chat_id, label, kind, payload):
+        from telebot import types
+
+        done = threading.Event()
+        with self._lock:
+            update_id = next(self._update_ids)
+            self._waiting[update_id] = done
+        user = {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'}
+        message = {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': user,
+            'text': payload if kind == 'text' else 'bench',
+        }
+        if kind == 'text':
+            update = {'update_id': update_id, 'message': message}
+        else:
+            update = {'update_id': update_id, 'callback_query': {
+                'id': str(update_id), 'from': user, 'chat_instance': 'bench',
+                'data': payload, 'message': message,
+            }}
+
+        start = time.perf_counter()
+        self.bot_module.bot.process_new_updates([types.Update.de_json(update)])
+        done.wait()
+        self.stats.add(label, time.perf_counter() - start)
+        with self._lock:
+            self.updates += 1
+
+
+def run_benchmark(args):
+    """Поднимает заменители, импортирует бота и прогоняет нагрузку"""
+    mealdb = FakeMealDB(meal_count=args.meals, latency=args.upstream_latency, seed=args.seed).start()
+    telegram = FakeTelegram().start()
+    workdir = tempfile.mkdtemp(prefix='recipe-bot-bench-')
+
+    # Окружение задается до импорта config, поэтому бот импортируется здесь
+    os.environ['BOT_TOKEN'] = '123456:BENCHMARK'
+    os.environ['MEAL_DB_BASE_URL'] = mealdb.base_url
+    os.environ['DATABASE_NAME'] = os.path.join(workdir, 'bench.db')
+    os.environ['CATALOG_ENABLED'] = '1' if args.catalog else '0'
+
+    try:
+        from telebot import apihelper
+        apihelper.API_URL = telegram.api_url
+
+        import bot as bot_module
+        from outbound import OutboundQueue
+
+        if not args.telegram_limits:
+            # Измеряем сам бот, а не потолок скорости Telegram
+            bot_module.bot.outbound = OutboundQueue(per_chat_rate=1e6, per_chat_burst=1e6,
+                                                    global_rate=1e6, global_burst=1e6)
+        if args.catalog:
+            bot_module.catalog.sync(bot_module.meal_api)
+
+        stats = LatencyStats()
+        instrument_database(bot_module.db, stats)
+
+        generator = LoadGenerator(bot_module, mealdb.meals, stats, args.users, args.sessions, args.seed).install()
+        elapsed = generator.run()
+        # Отправки не блокируют обработчики: дожидаемся, пока очередь опустеет
+        drain_start = time.perf_counter()
+        bot_module.bot.outbound.wait_idle()
+        elapsed += time.perf_counter() - drain_start
+
+        summary = stats.summary()
+        return {
+            'config': {
+                'users': args.users, 'sessions': args.sessions, 'meals': args.meals,
+                'upstream_latency': args.upstream_latency, 'catalog': args.catalog,
+                'telegram_limits': args.telegram_limits, 'seed': args.seed,
+            },
+            'updates': generator.updates,
+            'errors': generator.errors,
+            'elapsed': elapsed,
+            'updates_per_sec': generator.updates / elapsed if elapsed else 0.0,
+            'handlers': {label: value for label, value in summary.items() if not label.startswith('db.')},
+            'db': {label[3:]: value for label, value in summary.items() if label.startswith('db.')},
+            'upstream_requests': dict(mealdb.requests),
+            'telegram_calls': dict(telegram.calls),
+        }
+    finally:
+        mealdb.stop()
+        telegram.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def find_regressions(result, baseline, tolerance):
+    """Список описаний регрессий относительно эталона"""
+    regressions = []
+    if baseline.get('config') != result['config']:
+        print("⚠️ Параметры запуска отличаются от эталона, сравнение неточное")
+
+    base_rate = baseline.get('updates_per_sec', 0)
+    if base_rate and result['updates_per_sec'] < base_rate * (1 - tolerance):
+        regressions.append(
+            f"пропускная способность {result['updates_per_sec']:.1f} < {base_rate:.1f} обн./с"
+        )
+
+    for section in ('handlers', 'db'):
+        for label, current in result[section].items():
+            previous = baseline.get(section, {}).get(label)
+            if not previous or min(current['count'], previous['count']) < MIN_SAMPLES:
+                continue
+            if (current['p95'] > previous['p95'] * (1 + tolerance)
+                    and current['p95'] - previous['p95'] > MIN_LATENCY_DELTA):
+                regressions.append(
+                    f"{section}/{label}: p95 {current['p95'] * 1000:.1f} мс "
+                    f"(было {previous['p95'] * 1000:.1f} мс)"
+                )
+    return regressions
+
+
+def print_report(result):
+    print(f"📊 Обновлений: {result['updates']} за {result['elapsed']:.1f} с "
+          f"({result['updates_per_sec']:.1f} обн./с), ошибок: {result['errors']}\n")
+
+    for title, section in (("Обработчик", 'handlers'), ("Метод базы данных", 'db')):
+        print(f"{title:<28}{'Вызовов':>9}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+        for label, value in result[section].items():
+            print(f"{label:<28}{value['count']:>9}{value['p50'] * 1000:>10.2f}"
+                  f"{value['p95'] * 1000:>10.2f}{value['p99'] * 1000:>10.2f}")
+        print()
+
+    print(f"🌐 Запросы к TheMealDB: {result['upstream_requests']}")
+    print(f"✉️ Вызовы Telegram: {result['telegram_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный тест бота")
+    parser.add_argument('--users', type=int, default=20, help="одновременных пользователей")
+    parser.add_argument('--sessions', type=int, default=10, help="сценариев на пользователя")
+    parser.add_argument('--meals', type=int, default=300, help="рецептов в тестовом каталоге")
+    parser.add_argument('--upstream-latency', type=float, default=0.0,
+                        help="задержка ответов TheMealDB (в секундах)")
+    parser.add_argument('--catalog', action='store_true', help="включить локальное зеркало каталога")
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help="соблюдать лимиты скорости Telegram при отправке")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="файл эталона")
+    parser.add_argument('--save-baseline', action='store_true', help="сохранить результат как эталон")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое ухудшение (доля)")
+    parser.add_argument('--json', help="сохранить результат в файл")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        print(f"\n💾 Эталон сохранен: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nℹ️ Эталон не найден, запустите с --save-baseline")
+        return
+
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    regressions = find_regressions(result, baseline, args.tolerance)
+    if regressions:
+        print("\n🚨 Регрессии относительно эталона:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        raise SystemExit(1)
+    print("\n✅ Регрессий относительно эталона нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Локальные заменители TheMealDB и Telegram Bot API для нагрузочных тестов
+
+FakeMealDB отдает синтетический каталог в формате TheMealDB, FakeTelegram
+принимает вызовы Bot API и считает их. Оба сервера работают в фоновых
+потоках на случайном свободном порту.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CATEGORIES = ['Beef', 'Chicken', 'Dessert', 'Seafood', 'Vegetarian', 'Pasta', 'Side', 'Breakfast']
+AREAS = ['British', 'American', 'Italian', 'French', 'Indian', 'Chinese', 'Mexican', 'Japanese']
+INGREDIENTS = [
+    'Chicken', 'Beef', 'Salmon', 'Garlic', 'Onion', 'Salt', 'Pepper', 'Olive Oil', 'Butter',
+    'Eggs', 'Flour', 'Sugar', 'Milk', 'Tomato', 'Rice', 'Potatoes', 'Carrots', 'Lemon',
+    'Basil', 'Cheese', 'Penne Rigate', 'Ginger', 'Soy Sauce', 'Honey', 'Cream',
+]
+ADJECTIVES = ['Spicy', 'Roast', 'Creamy', 'Baked', 'Grilled', 'Stuffed', 'Classic', 'Crispy', 'Slow Cooked']
+DISHES = ['Pie', 'Curry', 'Stew', 'Salad', 'Soup', 'Risotto', 'Tart', 'Skewers', 'Casserole', 'Bake']
+MEASURES = ['1 tsp', '2 tbs', '100g', '1 cup', 'pinch', '2', '500ml', 'to taste', '']
+INSTRUCTIONS = (
+    'Preheat the oven to 180C. Chop the vegetables and fry them in butter until soft. '
+    'Add the remaining ingredients, season to taste and simmer for 20 minutes. '
+)
+
+
+def build_meals(count=300, seed=1, image_base_url=''):
+    """Синтетический каталог рецептов в формате ответа lookup.php"""
+    rng = random.Random(seed)
+    meals = []
+    for number in range(count):
+        main = rng.choice(INGREDIENTS)
+        meal = {
+            'idMeal': str(53000 + number),
+            'strMeal': f"{rng.choice(ADJECTIVES)} {main} {rng.choice(DISHES)}",
+            'strDrinkAlternate': None,
+            'strCategory': rng.choice(CATEGORIES),
+            'strArea': rng.choice(AREAS),
+            'strInstructions': INSTRUCTIONS * rng.randint(1, 8),
+            'strMealThumb': f"{image_base_url}/images/{53000 + number}.jpg",
+            'strTags': None,
+            'strYoutube': rng.choice(['', 'https://www.youtube.com/watch?v=bench']),
+            'strSource': None,
+        }
+        ingredients = [main] + rng.sample([name for name in INGREDIENTS if name != main], rng.randint(3, 14))
+        for index in range(1, 21):
+            has_ingredient = index <= len(ingredients)
+            meal[f'strIngredient{index}'] = ingredients[index - 1] if has_ingredient else ''
+            meal[f'strMeasure{index}'] = rng.choice(MEASURES) if has_ingredient else ''
+        meals.append(meal)
+    return meals
+
+
+def _short(meal):
+    """Краткая запись, как в ответе filter.php"""
+    return {'strMeal': meal['strMeal'], 'strMealThumb': meal['strMealThumb'], 'idMeal': meal['idMeal']}
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+
+class _BackgroundServer:
+    """HTTP-сервер в фоновом потоке"""
+
+    handler_class = None
+
+    def __init__(self, host='127.0.0.1'):
+        handler = type('Handler', (self.handler_class,), {'fake': self})
+        self.httpd = ThreadingHTTPServer((host, 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _MealDBHandler(_QuietHandler):
+
+    def do_GET(self):
+        fake = self.fake
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        parts = urlsplit(self.path)
+        endpoint = parts.path.rsplit('/', 1)[-1]
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+        if parts.path.startswith('/images/'):
+            self._send(200, fake.image, 'image/jpeg')
+            return
+
+        fake.requests[endpoint] += 1
+
+        handler = getattr(fake, 'handle_' + endpoint.replace('.php', ''), None)
+        if handler is None:
+            self._send(404, '{}')
+            return
+        self._send(200, json.dumps(handler(params)))
+
+
+class FakeMealDB(_BackgroundServer):
+    """Заменитель TheMealDB: search, filter, lookup, random, categories"""
+
+    handler_class = _MealDBHandler
+
+    def __init__(self, meal_count=300, latency=0.0, seed=1):
+        super().__init__()
+        self.latency = latency
+        self.requests = Counter()
+        self.meals = build_meals(meal_count, seed, image_base_url=self.url)
+        self.by_id = {meal['idMeal']: meal for meal in self.meals}
+        self.image = b'\xff\xd8\xff\xe0' + b'\x00' * 2048  # Заглушка JPEG
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return self.url + '/api/json/v1/1'
+
+    def handle_search(self, params):
+        if 'f' in params:
+            letter = params['f'].lower()
+            found = [meal for meal in self.meals if meal['strMeal'].lower().startswith(letter)]
+        else:
+            query = params.get('s', '').lower()
+            found = [meal for meal in self.meals if query in meal['strMeal'].lower()]
+        return {'meals': found or None}
+
+    def handle_filter(self, params):
+        if 'i' in params:
+            ingredient = params['i'].replace('_', ' ').lower()
+            found = [
+                meal for meal in self.meals
+                if any((meal[f'strIngredient{i}'] or '').lower() == ingredient for i in range(1, 21))
+            ]
+        else:
+            category = params.get('c', '').lower()
+            found = [meal for meal in self.meals if meal['strCategory'].lower() == category]
+        return {'meals': [_short(meal) for meal in found] or None}
+
+    def handle_lookup(self, params):
+        meal = self.by_id.get(params.get('i', ''))
+        return {'meals': [meal] if meal else None}
+
+    def handle_random(self, params):
+        with self._random_lock:
+            meal = self._random.choice(self.meals)
+        return {'meals': [meal]}
+
+    def handle_categories(self, params):
+        return {'categories': [
+            {'idCategory': str(number), 'strCategory': name,
+             'strCategoryThumb': f"{self.url}/images/category-{number}.png",
+             'strCategoryDescription': name}
+            for number, name in enumerate(CATEGORIES, 1)
+        ]}
+
+
+class _TelegramHandler(_QuietHandler):
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        body = self._read_body()
+        parts = urlsplit(self.path)
+        method = parts.path.rsplit('/', 1)[-1]
+        # telebot передает параметры в строке запроса; форму тоже разбираем
+        query = parts.query
+        if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            query = '&'.join(filter(None, [query, body.decode('utf-8')]))
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        result = self.fake.handle(method, params)
+        self._send(200, json.dumps({'ok': True, 'result': result}))
+
+
+class FakeTelegram(_BackgroundServer):
+    """Заменитель Telegram Bot API: считает вызовы и возвращает сообщения"""
+
+    handler_class = _TelegramHandler
+
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+        self._message_ids = iter(range(1, 1 << 62))
+        self._lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        """Шаблон адреса для telebot.apihelper.API_URL"""
+        return self.url + '/bot{0}/{1}'
+
+    def _message(self, params, **extra):
+        with self._lock:
+            message_id = next(self._message_ids)
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+        }
+        message.update(extra)
+        return message
+
+    def handle(self, method, params):
+        with self._lock:
+            self.calls[method] += 1
+
+        if method == 'sendMessage':
+            return self._message(params, text=params.get('text', ''))
+        if method == 'sendPhoto':
+            return self._message(params, photo=[{
+                'file_id': f"bench-photo-{self.calls[method]}",
+                'file_unique_id': f"bench-{self.calls[method]}",
+                'width': 320, 'height': 320,
+            }])
+        if method == 'sendMediaGroup':
+            media = json.loads(params.get('media', '[]'))
+            return [self._message(params) for _ in media]
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        return True
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк форматов хранения рецептов: размер на диске и время декодирования
+
+Запуск из корня проекта:
+    python -m benchmarks.recipe_codec [--repeat 2000]
+
+Рецепты берутся из базы бота (таблицы recipes и favorites). Если база пуста,
+используется синтетический рецепт в формате TheMealDB.
+"""
+
+import argparse
+import sqlite3
+import time
+from collections import Counter
+from config import DATABASE_NAME
+from recipe_codec import CODECS, compact_recipe, decode_recipe
+
+SAMPLE_RECIPE = {
+    'idMeal': '52771',
+    'strMeal': 'Spicy Arrabiata Penne',
+    'strDrinkAlternate': None,
+    'strCategory': 'Vegetarian',
+    'strArea': 'Italian',
+    'strInstructions': (
+        'Bring a large pot of water to a boil. Add kosher salt to the boiling water, '
+        'then add the pasta. Cook according to the package instructions, about 9 minutes. '
+        'In a large skillet over medium-high heat, add the olive oil and heat until the oil '
+        'starts to shimmer. Add the garlic and cook, stirring, until fragrant, 1 to 2 minutes. '
+        'Add the chopped tomatoes, red chile flakes, Italian seasoning and salt and pepper to taste. '
+        'Bring to a boil and cook for 5 minutes. Remove from the heat and add the chopped basil. '
+        'Drain the pasta and add it to the sauce. Garnish with Parmigiano-Reggiano flakes and more basil '
+        'and serve warm.'
+    ),
+    'strMealThumb': 'https://www.themealdb.com/images/media/meals/ustsqw1468250014.jpg',
+    'strTags': 'Pasta,Curry',
+    'strYoutube': 'https://www.youtube.com/watch?v=1IszT_guI08',
+    'strSource': None,
+    'strImageSource': None,
+    'strCreativeCommonsConfirmed': None,
+    'dateModified': None,
+}
+for _i, (_ingredient, _measure) in enumerate([
+    ('penne rigate', '1 pound'), ('olive oil', '1/4 cup'), ('garlic', '3 cloves'),
+    ('chopped tomatoes', '1 tin '), ('red chile flakes', '1/2 teaspoon'),
+    ('italian seasoning', '1/2 teaspoon'), ('basil', '6 leaves'),
+    ('Parmigiano-Reggiano', 'spinkling'),
+], 1):
+    SAMPLE_RECIPE[f'strIngredient{_i}'] = _ingredient
+    SAMPLE_RECIPE[f'strMeasure{_i}'] = _measure
+for _i in range(9, 21):
+    SAMPLE_RECIPE[f'strIngredient{_i}'] = ''
+    SAMPLE_RECIPE[f'strMeasure{_i}'] = ''
+
+
+def load_samples():
+    """Рецепты из базы бота или синтетический пример"""
+    samples = []
+    try:
+        with sqlite3.connect(DATABASE_NAME) as conn:
+            cursor = conn.cursor()
+            for table in ('recipes', 'favorites'):
+                try:
+                    cursor.execute(f"SELECT recipe_data FROM {table} WHERE recipe_data != ''")
+                except sqlite3.Error:
+                    continue
+                for (payload,) in cursor.fetchall():
+                    try:
+                        samples.append(decode_recipe(payload))
+                    except ValueError:
+                        pass
+    except sqlite3.Error as e:
+        print(f"⚠️ Не удалось прочитать базу данных: {e}")
+
+    unique = {recipe.get('idMeal'): recipe for recipe in samples}
+    return list(unique.values()) or [SAMPLE_RECIPE]
+
+
+def suggest_dictionary(samples, size=2048):
+    """Подсказка для нового словаря: самые частые значения в рецептах"""
+    counter = Counter()
+    for recipe in samples:
+        for key, value in compact_recipe(recipe).items():
+            counter[f'"{key}":'] += 1
+            if isinstance(value, str) and len(value) < 40:
+                counter[f'"{value}",'] += 1
+
+    fragments = [fragment for fragment, count in counter.most_common() if count > 1]
+    result = ''
+    for fragment in fragments:
+        if len(result) + len(fragment) > size:
+            break
+        # Более частые фрагменты должны оказаться ближе к концу словаря
+        result = fragment + result
+    return result
+
+
+def benchmark(samples, repeat):
+    """Размер и время декодирования для каждого кодека"""
+    results = []
+    for name, codec in CODECS.items():
+        encoded = [codec.encode(recipe) for recipe in samples]
+        size = sum(len(payload.encode('utf-8') if isinstance(payload, str) else payload)
+                   for payload in encoded)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for payload in encoded:
+                decode_recipe(payload)
+        decode_us = (time.perf_counter() - start) / (repeat * len(encoded)) * 1e6
+
+        results.append((name, size / len(encoded), decode_us))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение форматов хранения рецептов")
+    parser.add_argument('--repeat', type=int, default=2000, help="повторов декодирования")
+    parser.add_argument('--show-dictionary', action='store_true',
+                        help="вывести словарь, подобранный по рецептам из базы")
+    args = parser.parse_args()
+
+    samples = load_samples()
+    print(f"📊 Рецептов в выборке: {len(samples)}\n")
+
+    results = benchmark(samples, args.repeat)
+    baseline_size = results[0][1]
+
+    print(f"{'Кодек':<12}{'Байт/рецепт':>14}{'Сжатие':>10}{'Декод., мкс':>14}")
+    for name, size, decode_us in results:
+        print(f"{name:<12}{size:>14.0f}{baseline_size / size:>9.2f}x{decode_us:>14.1f}")
+
+    if args.show_dictionary:
+        print("\n📖 Предлагаемый словарь:\n")
+        print(suggest_dictionary(samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,54 @@
-import telebot
 from telebot import types
 import os
-from config import BOT_TOKEN
-from api_client import TheMealDBClient, RecipeFormatter
+import time
+import atexit
+from config import (
+    BOT_TOKEN, CATALOG_ENABLED, USER_STATE_TTL, VIEW_PREFERENCE_TTL, MESSAGE_CHUNK_SIZE,
+    CALLBACK_TOKEN_TTL,
+)
+from api_client import TheMealDBClient, MealEnricher, RecipeFormatter
+from cache import TieredCache, FileIdCache
+from catalog import MealCatalog
+from delivery import CardDelivery
+from dispatcher import DispatchingTeleBot
 from database import db
+from state_store import create_state_store
+from callback_router import CallbackRouter
+from random_pool import RandomMealPool
+from prefetch import PrefetchScheduler
+from metrics import (
+    timed_handler, register_cache_stats, UPDATE_SECONDS, OUTBOUND_QUEUE_DEPTH, UPDATE_QUEUE_DEPTH,
+    PREFETCH_QUEUE_DEPTH,
+)
 
 # Инициализация бота и API клиента
-bot = telebot.TeleBot(BOT_TOKEN)
-meal_api = TheMealDBClient()
+bot = DispatchingTeleBot(BOT_TOKEN)
+catalog = MealCatalog() if CATALOG_ENABLED else None
+api_cache = TieredCache()
+meal_api = TheMealDBClient(cache=api_cache, catalog=catalog)
+meal_enricher = MealEnricher(meal_api)
+card_delivery = CardDelivery(bot, meal_api.session, file_ids=FileIdCache())
+random_meals = RandomMealPool(meal_api).start()
+meal_prefetcher = PrefetchScheduler(meal_api.get_meal_details)
+
+# Закрываем пул HTTP-соединений при завершении процесса
+atexit.register(meal_api.close)
+atexit.register(meal_enricher.close)
+atexit.register(db.pool.close_all)
+
+# Метрики для /metrics: кэш ответов API и глубина очередей
+register_cache_stats(api_cache)
+OUTBOUND_QUEUE_DEPTH.set_function(bot.outbound.depth)
+UPDATE_QUEUE_DEPTH.set_function(bot.dispatcher.depth)
+PREFETCH_QUEUE_DEPTH.set_function(meal_prefetcher.depth)
+
+# Поддерживаем локальное зеркало каталога в актуальном состоянии
+if catalog is not None:
+    catalog.start_background_refresh(meal_api)
 
 # Обработчик команды /start
 @bot.message_handler(commands=['start'])
+@timed_handler('command')
 def send_welcome(message):
     """Обработчик команды /start - показывает приветствие и главное меню"""
     welcome_text = (
@@ -48,69 +86,52 @@ def create_main_menu():
     return markup
 
 
+# Маршруты inline кнопок; большие параметры кнопок хранятся на сервере
+# и записываются сразу: нажатие может обработать другой процесс
+callback_router = CallbackRouter(
+    tokens=create_state_store('callback_tokens', CALLBACK_TOKEN_TTL, write_through=True)
+)
+atexit.register(callback_router.tokens.flush)
+
 # Обработчик inline кнопок
 @bot.callback_query_handler(func=lambda call: True)
 def callback_query_handler(call):
     """Обработчик нажатий на inline кнопки"""
     chat_id = call.message.chat.id
-    
-    if call.data == "search_recipes":
-        handle_search_recipes(chat_id)
-    elif call.data == "my_recipes":
-        handle_my_recipes(chat_id)
-    elif call.data == "back_to_main":
-        send_main_menu(chat_id)
-    elif call.data == "search_random":
-        handle_random_recipe(chat_id)
-    elif call.data == "search_by_name":
-        handle_search_by_name_start(chat_id)
-    elif call.data == "search_by_ingredient":
-        handle_search_by_ingredient_start(chat_id)
-    elif call.data == "search_by_category":
-        handle_search_by_category_start(chat_id)
-    elif call.data.startswith("save_recipe_"):
-        recipe_id = call.data.replace("save_recipe_", "")
-        handle_save_recipe(chat_id, recipe_id)
-    elif call.data.startswith("view_recipe_"):
-        recipe_id = call.data.replace("view_recipe_", "")
-        handle_view_recipe(chat_id, recipe_id)
-    elif call.data.startswith("recipe_details_"):
-        recipe_id = call.data.replace("recipe_details_", "")
-        handle_recipe_details(chat_id, recipe_id)
-    elif call.data.startswith("category_"):
-        category = call.data.replace("category_", "")
-        handle_category_search(chat_id, category)
-    elif call.data.startswith("fav_details_"):
-        recipe_id = call.data.replace("fav_details_", "")
-        handle_favorite_details(chat_id, recipe_id)
-    elif call.data.startswith("remove_fav_"):
-        recipe_id = call.data.replace("remove_fav_", "")
-        handle_remove_favorite(chat_id, recipe_id)
-    elif call.data.startswith("rate_recipe_"):
-        recipe_id = call.data.replace("rate_recipe_", "")
-        handle_rate_recipe(chat_id, recipe_id)
-    elif call.data == "view_list":
-        user_view_preferences[chat_id] = 'list'
-        handle_my_recipes(chat_id)
-    elif call.data == "view_cards":
-        user_view_preferences[chat_id] = 'cards'
-        handle_my_recipes(chat_id)
-    elif call.data.startswith("set_rating_"):
-        # Формат: set_rating_recipe_id_rating
-        parts = call.data.split("_")
-        if len(parts) >= 4:
-            recipe_id = parts[2]
-            rating = int(parts[3])
-            handle_set_rating(chat_id, recipe_id, rating)
-    elif call.data == "show_more_favorites":
-        handle_show_more_favorites(chat_id)
-    elif call.data == "back_to_main":
-        send_main_menu(chat_id)
-    
-    # Убираем "часики" с кнопки
-    bot.answer_callback_query(call.id)
+    start = time.perf_counter()
+    route = None
+    answer_text = None
+    
+    try:
+        route, args = callback_router.resolve(call.data)
+        handler = callback_router.handler_for(route)
+        if handler is None or args is None:
+            answer_text = "⌛ Кнопка устарела. Откройте меню заново."
+        else:
+            handler(chat_id, *args)
+    finally:
+        # Убираем "часики" с кнопки, даже если обработчик упал
+        bot.answer_callback_query(call.id, answer_text)
+        UPDATE_SECONDS.observe(
+            time.perf_counter() - start, kind='callback', route=route.name if route else 'unknown'
+        )
+
+
+@callback_router.handler('view_list')
+def handle_view_list(chat_id):
+    """Показывать избранное списком"""
+    user_view_preferences[chat_id] = 'list'
+    handle_my_recipes(chat_id)
 
 
+@callback_router.handler('view_cards')
+def handle_view_cards(chat_id):
+    """Показывать избранное карточками"""
+    user_view_preferences[chat_id] = 'cards'
+    handle_my_recipes(chat_id)
+
+
+@callback_router.handler('back_to_main')
 def send_main_menu(chat_id):
     """Отправляет главное меню"""
     menu_text = "🍽️ Главное меню\n\nВыберите действие:"
@@ -118,6 +139,7 @@ def send_main_menu(chat_id):
     bot.send_message(chat_id, menu_text, reply_markup=main_menu)
 
 
+@callback_router.handler('search_recipes')
 def handle_search_recipes(chat_id):
     """Обработчик поиска рецептов - показывает меню типов поиска"""
     search_text = (
@@ -146,9 +168,16 @@ def handle_search_recipes(chat_id):
     bot.send_message(chat_id, search_text, reply_markup=markup)
 
 
+@callback_router.handler('my_recipes')
 def handle_my_recipes(chat_id):
     """Обработчик просмотра избранных рецептов"""
-    favorites = db.get_user_favorites(chat_id, limit=20)
+    # Получаем предпочтение отображения пользователя
+    view_mode = user_view_preferences.get(chat_id, 'cards')  # По умолчанию карточки
+    
+    # Для списка достаточно кратких данных, JSON рецептов не нужен
+    favorites, next_cursor = db.get_user_favorites_page(
+        chat_id, page_size=10, summary=(view_mode == 'list')
+    )
     
     if not favorites:
         favorites_text = (
@@ -166,11 +195,8 @@ def handle_my_recipes(chat_id):
         bot.send_message(chat_id, favorites_text, reply_markup=markup)
         return
     
-    # Получаем предпочтение отображения пользователя
-    view_mode = user_view_preferences.get(chat_id, 'cards')  # По умолчанию карточки
-    
     # Отправляем заголовок с кнопками переключения
-    total_count = len(favorites)
+    total_count = db.get_favorites_count(chat_id)
     header_text = f"⭐ Мои рецепты ({total_count})\n\n"
     if view_mode == 'cards':
         header_text += "📱 Режим: Карточки с фото"
@@ -182,9 +208,9 @@ def handle_my_recipes(chat_id):
     
     # Показываем рецепты в выбранном режиме
     if view_mode == 'cards':
-        show_favorites_as_cards(chat_id, favorites[:10])
+        show_favorites_as_cards(chat_id, favorites)
     else:
-        show_favorites_as_list(chat_id, favorites[:10])
+        show_favorites_as_list(chat_id, favorites)
     
     # Информация о результатах с кнопками навигации
     info_markup = types.InlineKeyboardMarkup(row_width=2)
@@ -198,10 +224,10 @@ def handle_my_recipes(chat_id):
         info_markup.add(cards_btn)
     
     # Кнопка показа больше рецептов (если есть)
-    if total_count > 10:
+    if next_cursor:
         more_btn = types.InlineKeyboardButton(
-            f"📋 Показано {min(10, total_count)} из {total_count}", 
-            callback_data="show_more_favorites"
+            f"📋 Показано {len(favorites)} из {total_count}", 
+            callback_data=callback_router.encode('show_more_favorites', next_cursor, len(favorites))
         )
         info_markup.add(more_btn)
     
@@ -232,28 +258,21 @@ def show_favorites_as_cards(chat_id, favorites):
             markup = types.InlineKeyboardMarkup(row_width=2)
             details_btn = types.InlineKeyboardButton(
                 "📖 Подробнее", 
-                callback_data=f"fav_details_{favorite['recipe_id']}"
+                callback_data=callback_router.encode('fav_details', favorite['recipe_id'])
             )
             rate_btn = types.InlineKeyboardButton(
                 "⭐ Оценить", 
-                callback_data=f"rate_recipe_{favorite['recipe_id']}"
+                callback_data=callback_router.encode('rate_recipe', favorite['recipe_id'])
             )
             remove_btn = types.InlineKeyboardButton(
                 "🗑️ Удалить", 
-                callback_data=f"remove_fav_{favorite['recipe_id']}"
+                callback_data=callback_router.encode('remove_fav', favorite['recipe_id'])
             )
             
             markup.add(details_btn, rate_btn)
             markup.add(remove_btn)
             
-            try:
-                if image_url:
-                    bot.send_photo(chat_id, image_url, caption=text, reply_markup=markup, parse_mode='Markdown')
-                else:
-                    bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
-            except Exception as e:
-                print(f"Ошибка отправки избранного рецепта: {e}")
-                bot.send_message(chat_id, text, reply_markup=markup)
+            card_delivery.send_card(chat_id, text, image_url, markup)
 
 def show_favorites_as_list(chat_id, favorites):
     """Показать избранные рецепты в виде списка"""
@@ -286,15 +305,15 @@ def show_favorites_as_list(chat_id, favorites):
         
         details_btn = types.InlineKeyboardButton(
             "📖", 
-            callback_data=f"fav_details_{recipe_id}"
+            callback_data=callback_router.encode('fav_details', recipe_id)
         )
         rate_btn = types.InlineKeyboardButton(
             f"⭐ {current_rating}/5", 
-            callback_data=f"rate_recipe_{recipe_id}"
+            callback_data=callback_router.encode('rate_recipe', recipe_id)
         )
         remove_btn = types.InlineKeyboardButton(
             "🗑️", 
-            callback_data=f"remove_fav_{recipe_id}"
+            callback_data=callback_router.encode('remove_fav', recipe_id)
         )
         
         recipe_markup.add(details_btn, rate_btn, remove_btn)
@@ -309,6 +328,7 @@ def show_favorites_as_list(chat_id, favorites):
         if i < len(favorites):
             bot.send_message(chat_id, "─" * 40)
 
+@callback_router.handler('save_recipe')
 def handle_save_recipe(chat_id, recipe_id):
     """Обработчик сохранения рецепта в избранное"""
     # Проверяем, не добавлен ли уже рецепт в избранное
@@ -326,7 +346,7 @@ def handle_save_recipe(chat_id, recipe_id):
     if meal_data:
         # Сохраняем в базу данных
         if db.add_favorite(chat_id, meal_data):
-            recipe_name = meal_data.get('strMeal', 'Неизвестное блюдо')
+            recipe_name = meal_data.name or 'Неизвестное блюдо'
             favorites_count = db.get_favorites_count(chat_id)
             
             bot.send_message(
@@ -347,6 +367,7 @@ def handle_save_recipe(chat_id, recipe_id):
         )
 
 
+@callback_router.handler('view_recipe')
 def handle_view_recipe(chat_id, recipe_id):
     """Обработчик просмотра детальной информации о рецепте"""
     # TODO: Здесь будет логика получения полной информации о рецепте из API
@@ -359,32 +380,26 @@ def handle_view_recipe(chat_id, recipe_id):
     )
 
 
-# Словари для хранения состояний и настроек пользователей
-user_states = {}
-user_view_preferences = {}  # 'list' или 'cards'
+# Хранилища состояний и настроек пользователей
+user_states = create_state_store('user_states', USER_STATE_TTL)
+user_view_preferences = create_state_store('view_preferences', VIEW_PREFERENCE_TTL)  # 'list' или 'cards'
+atexit.register(user_states.flush)
+atexit.register(user_view_preferences.flush)
 
+@callback_router.handler('search_random')
 def handle_random_recipe(chat_id):
     """Обработчик получения случайного рецепта"""
-    bot.send_message(chat_id, "🎲 Ищу случайный рецепт...")
-    
-    meal = meal_api.get_random_meal()
+    meal = random_meals.get(chat_id)
     if meal:
-        text, image_url = RecipeFormatter.format_recipe_card(meal)
+        rendered = RecipeFormatter.render(meal)
         
         # Создаем кнопки для рецепта
-        markup = types.InlineKeyboardMarkup(row_width=2)
-        details_btn = types.InlineKeyboardButton("📖 Подробнее", callback_data=f"recipe_details_{meal['idMeal']}")
-        save_btn = types.InlineKeyboardButton("⭐ Сохранить", callback_data=f"save_recipe_{meal['idMeal']}")
+        markup = keyboard_from_layout(rendered.card_keyboard)
         back_btn = types.InlineKeyboardButton("◀️ Назад к поиску", callback_data="search_recipes")
         menu_btn = types.InlineKeyboardButton("🏠 В меню", callback_data="back_to_main")
-        
-        markup.add(details_btn, save_btn)
         markup.add(back_btn, menu_btn)
         
-        if image_url:
-            bot.send_photo(chat_id, image_url, caption=text, reply_markup=markup, parse_mode='Markdown')
-        else:
-            bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
+        card_delivery.send_card(chat_id, rendered.card_text, rendered.image_url, markup)
     else:
         markup = types.InlineKeyboardMarkup(row_width=2)
         back_btn = types.InlineKeyboardButton("◀️ Назад к поиску", callback_data="search_recipes")
@@ -392,6 +407,7 @@ def handle_random_recipe(chat_id):
         markup.add(back_btn, menu_btn)
         bot.send_message(chat_id, "❌ Не удалось получить случайный рецепт. Попробуйте позже.", reply_markup=markup)
 
+@callback_router.handler('search_by_name')
 def handle_search_by_name_start(chat_id):
     """Начало поиска по названию"""
     user_states[chat_id] = "waiting_for_name"
@@ -408,6 +424,7 @@ def handle_search_by_name_start(chat_id):
         parse_mode='Markdown'
     )
 
+@callback_router.handler('search_by_ingredient')
 def handle_search_by_ingredient_start(chat_id):
     """Начало поиска по ингредиенту"""
     user_states[chat_id] = "waiting_for_ingredient"
@@ -419,11 +436,13 @@ def handle_search_by_ingredient_start(chat_id):
     bot.send_message(
         chat_id,
         "🥕 Введите название ингредиента:\n\n"
-        "Например: *chicken*, *tomato*, *cheese*",
+        "Например: *chicken*, *tomato*, *cheese*\n"
+        "Можно указать несколько через запятую: *chicken, rice, garlic*",
         reply_markup=markup,
         parse_mode='Markdown'
     )
 
+@callback_router.handler('search_by_category')
 def handle_search_by_category_start(chat_id):
     """Показ категорий для выбора"""
     bot.send_message(chat_id, "📂 Загружаю категории...")
@@ -440,7 +459,7 @@ def handle_search_by_category_start(chat_id):
             if category_name:
                 btn = types.InlineKeyboardButton(
                     f"{'⭐ ' if category_name in popular_categories else ''}{category_name}",
-                    callback_data=f"category_{category_name}"
+                    callback_data=callback_router.encode('category', category_name)
                 )
                 markup.add(btn)
         
@@ -455,16 +474,17 @@ def handle_search_by_category_start(chat_id):
         markup.add(back_btn, menu_btn)
         bot.send_message(chat_id, "❌ Не удалось загрузить категории.", reply_markup=markup)
 
+@callback_router.handler('recipe_details')
 def handle_recipe_details(chat_id, recipe_id):
     """Показ детальной информации о рецепте"""
     bot.send_message(chat_id, "📖 Загружаю полный рецепт...")
     
     meal = meal_api.get_meal_details(recipe_id)
     if meal:
-        text = RecipeFormatter.format_full_recipe(meal)
+        parts = RecipeFormatter.render(meal).full_chunks
         
         markup = types.InlineKeyboardMarkup(row_width=2)
-        save_btn = types.InlineKeyboardButton("⭐ Сохранить", callback_data=f"save_recipe_{recipe_id}")
+        save_btn = types.InlineKeyboardButton("⭐ Сохранить", callback_data=callback_router.encode('save_recipe', recipe_id))
         back_btn = types.InlineKeyboardButton("◀️ Назад к поиску", callback_data="search_recipes")
         menu_btn = types.InlineKeyboardButton("🏠 В меню", callback_data="back_to_main")
         
@@ -472,15 +492,7 @@ def handle_recipe_details(chat_id, recipe_id):
         markup.add(back_btn, menu_btn)
         
         # Отправляем длинный текст частями, если необходимо
-        if len(text) > 4000:
-            parts = [text[i:i+4000] for i in range(0, len(text), 4000)]
-            for i, part in enumerate(parts):
-                if i == len(parts) - 1:  # Последняя часть
-                    bot.send_message(chat_id, part, reply_markup=markup, parse_mode='Markdown')
-                else:
-                    bot.send_message(chat_id, part, parse_mode='Markdown')
-        else:
-            bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
+        send_text_parts(chat_id, parts, markup)
     else:
         markup = types.InlineKeyboardMarkup(row_width=2)
         back_btn = types.InlineKeyboardButton("◀️ Назад к поиску", callback_data="search_recipes")
@@ -488,6 +500,29 @@ def handle_recipe_details(chat_id, recipe_id):
         markup.add(back_btn, menu_btn)
         bot.send_message(chat_id, "❌ Не удалось загрузить рецепт.", reply_markup=markup)
 
+def build_search_card(meal):
+    """Собирает карточку найденного рецепта: текст, фото и кнопки"""
+    rendered = RecipeFormatter.render(meal)
+    return rendered.card_text, rendered.image_url, keyboard_from_layout(rendered.card_keyboard)
+
+def keyboard_from_layout(layout):
+    """Клавиатура из раскладки кнопок: ряды пар (текст, (маршрут, аргументы...))"""
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    for row in layout:
+        markup.row(*[
+            types.InlineKeyboardButton(text, callback_data=callback_router.encode(*route))
+            for text, route in row
+        ])
+    return markup
+
+def send_text_parts(chat_id, parts, markup):
+    """Отправляет текст частями; кнопки прикрепляются к последней части"""
+    for i, part in enumerate(parts):
+        if i == len(parts) - 1:  # Последняя часть
+            bot.send_message(chat_id, part, reply_markup=markup, parse_mode='Markdown')
+        else:
+            bot.send_message(chat_id, part, parse_mode='Markdown')
+
 def perform_search(chat_id, query, search_type):
     """Выполняет поиск и отображает результаты"""
     bot.send_message(chat_id, f"🔍 Ищу рецепты...")
@@ -495,28 +530,32 @@ def perform_search(chat_id, query, search_type):
     meals = []
     if search_type == "name":
         meals = meal_api.search_meal_by_name(query)
+        if not meals:
+            # Точных совпадений нет - пробуем найти с учетом опечаток
+            meals = meal_api.fuzzy_search_meal_by_name(query)
+            if meals:
+                bot.send_message(chat_id, f"🤔 Точных совпадений для '{query}' нет. Возможно, вы искали:")
     elif search_type == "ingredient":
-        meals = meal_api.search_by_ingredient(query)
+        ingredients = [item.strip() for item in query.split(",") if item.strip()]
+        if len(ingredients) > 1:
+            # Сначала рецепты со всеми ингредиентами, иначе - с частью из них
+            meals = meal_api.search_by_ingredients(ingredients)
+            if not meals:
+                meals = meal_api.search_by_ingredients(ingredients, match_all=False)
+        else:
+            meals = meal_api.search_by_ingredient(query)
     
     if meals:
         # Показываем первые несколько рецептов
-        for i, meal in enumerate(meals[:5]):  # Показываем первые 5
-            text, image_url = RecipeFormatter.format_recipe_card(meal)
-            
-            markup = types.InlineKeyboardMarkup(row_width=2)
-            details_btn = types.InlineKeyboardButton("📖 Подробнее", callback_data=f"recipe_details_{meal['idMeal']}")
-            save_btn = types.InlineKeyboardButton("⭐ Сохранить", callback_data=f"save_recipe_{meal['idMeal']}")
-            
-            markup.add(details_btn, save_btn)
-            
-            try:
-                if image_url:
-                    bot.send_photo(chat_id, image_url, caption=text, reply_markup=markup, parse_mode='Markdown')
-                else:
-                    bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
-            except Exception as e:
-                print(f"Ошибка отправки рецепта: {e}")
-                bot.send_message(chat_id, text, reply_markup=markup)
+        shown_meals = meals[:5]  # Показываем первые 5
+        if search_type == "ingredient":
+            # filter.php возвращает только id, название и фото - догружаем детали параллельно
+            shown_meals = meal_enricher.enrich_meals(shown_meals)
+        
+        card_delivery.deliver(chat_id, [build_search_card(meal) for meal in shown_meals])
+        
+        # Детали для "Подробнее" и "Сохранить" загружаем заранее
+        meal_prefetcher.schedule(chat_id, [meal.id for meal in shown_meals])
         
         # Кнопки навигации
         markup = types.InlineKeyboardMarkup(row_width=2)
@@ -544,30 +583,20 @@ def perform_search(chat_id, query, search_type):
             reply_markup=markup
         )
 
+@callback_router.handler('category')
 def handle_category_search(chat_id, category):
     """Обработчик поиска по категории"""
     bot.send_message(chat_id, f"📂 Ищу рецепты в категории {category}...")
     
     meals = meal_api.filter_by_category(category)
     if meals:
-        # Показываем первые 5 рецептов из категории
-        for i, meal in enumerate(meals[:5]):
-            text, image_url = RecipeFormatter.format_recipe_card(meal)
-            
-            markup = types.InlineKeyboardMarkup(row_width=2)
-            details_btn = types.InlineKeyboardButton("📖 Подробнее", callback_data=f"recipe_details_{meal['idMeal']}")
-            save_btn = types.InlineKeyboardButton("⭐ Сохранить", callback_data=f"save_recipe_{meal['idMeal']}")
-            
-            markup.add(details_btn, save_btn)
-            
-            try:
-                if image_url:
-                    bot.send_photo(chat_id, image_url, caption=text, reply_markup=markup, parse_mode='Markdown')
-                else:
-                    bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
-            except Exception as e:
-                print(f"Ошибка отправки рецепта: {e}")
-                bot.send_message(chat_id, text, reply_markup=markup)
+        # Показываем первые 5 рецептов из категории с полными деталями
+        shown_meals = meal_enricher.enrich_meals(meals[:5])
+        
+        card_delivery.deliver(chat_id, [build_search_card(meal) for meal in shown_meals])
+        
+        # Детали для "Подробнее" и "Сохранить" загружаем заранее
+        meal_prefetcher.schedule(chat_id, [meal.id for meal in shown_meals])
         
         # Информация о результатах
         markup = types.InlineKeyboardMarkup(row_width=2)
@@ -590,43 +619,41 @@ def handle_category_search(chat_id, category):
         markup.add(back_btn, menu_btn)
         bot.send_message(chat_id, f"❌ Рецепты в категории {category} не найдены.", reply_markup=markup)
 
+@callback_router.handler('fav_details')
 def handle_favorite_details(chat_id, recipe_id):
     """Показ детальной информации об избранном рецепте"""
     # Сначала проверяем в избранном пользователя
     favorite_recipe = db.get_favorite_by_id(chat_id, recipe_id)
     
     if favorite_recipe:
-        text = RecipeFormatter.format_full_recipe(favorite_recipe)
+        meal, rating = favorite_recipe
+        parts = list(RecipeFormatter.render(meal).full_chunks)
         
         # Добавляем информацию о рейтинге
-        rating = favorite_recipe.get('rating', 0)
         stars = "⭐" * rating + "☆" * (5 - rating) if rating > 0 else "☆☆☆☆☆"
-        text += f"\n\n⭐ **Рейтинг:** {stars} ({rating}/5)"
+        rating_text = f"\n\n⭐ **Рейтинг:** {stars} ({rating}/5)"
+        if len(parts[-1]) + len(rating_text) <= MESSAGE_CHUNK_SIZE:
+            parts[-1] += rating_text
+        else:
+            parts.append(rating_text)
         
         markup = types.InlineKeyboardMarkup(row_width=2)
-        rate_btn = types.InlineKeyboardButton("⭐ Оценить", callback_data=f"rate_recipe_{recipe_id}")
-        remove_btn = types.InlineKeyboardButton("🗑️ Удалить из избранного", callback_data=f"remove_fav_{recipe_id}")
+        rate_btn = types.InlineKeyboardButton("⭐ Оценить", callback_data=callback_router.encode('rate_recipe', recipe_id))
+        remove_btn = types.InlineKeyboardButton("🗑️ Удалить из избранного", callback_data=callback_router.encode('remove_fav', recipe_id))
         back_btn = types.InlineKeyboardButton("◀️ К моим рецептам", callback_data="my_recipes")
         
         markup.add(rate_btn, remove_btn)
         markup.add(back_btn)
         
         # Отправляем длинный текст частями, если необходимо
-        if len(text) > 4000:
-            parts = [text[i:i+4000] for i in range(0, len(text), 4000)]
-            for i, part in enumerate(parts):
-                if i == len(parts) - 1:  # Последняя часть
-                    bot.send_message(chat_id, part, reply_markup=markup, parse_mode='Markdown')
-                else:
-                    bot.send_message(chat_id, part, parse_mode='Markdown')
-        else:
-            bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
+        send_text_parts(chat_id, parts, markup)
     else:
         markup = types.InlineKeyboardMarkup()
         back_btn = types.InlineKeyboardButton("◀️ К моим рецептам", callback_data="my_recipes")
         markup.add(back_btn)
         bot.send_message(chat_id, "❌ Рецепт не найден в избранном.", reply_markup=markup)
 
+@callback_router.handler('remove_fav')
 def handle_remove_favorite(chat_id, recipe_id):
     """Удаление рецепта из избранного"""
     if db.remove_favorite(chat_id, recipe_id):
@@ -645,6 +672,7 @@ def handle_remove_favorite(chat_id, recipe_id):
             "❌ Не удалось удалить рецепт из избранного."
         )
 
+@callback_router.handler('rate_recipe')
 def handle_rate_recipe(chat_id, recipe_id):
     """Показать меню для оценки рецепта"""
     # Получаем информацию о рецепте
@@ -654,8 +682,8 @@ def handle_rate_recipe(chat_id, recipe_id):
         bot.send_message(chat_id, "❌ Рецепт не найден в избранном.")
         return
     
-    recipe_name = favorite_recipe.get('strMeal', 'Неизвестное блюдо')
-    current_rating = favorite_recipe.get('rating', 0)
+    meal, current_rating = favorite_recipe
+    recipe_name = meal.name or 'Неизвестное блюдо'
     
     # Формируем звезды текущего рейтинга
     current_stars = "⭐" * current_rating + "☆" * (5 - current_rating) if current_rating > 0 else "☆☆☆☆☆"
@@ -672,7 +700,7 @@ def handle_rate_recipe(chat_id, recipe_id):
         stars = "⭐" * i + "☆" * (5 - i)
         btn = types.InlineKeyboardButton(
             f"{i} {stars}", 
-            callback_data=f"set_rating_{recipe_id}_{i}"
+            callback_data=callback_router.encode('set_rating', recipe_id, i)
         )
         rating_buttons.append(btn)
     
@@ -684,12 +712,13 @@ def handle_rate_recipe(chat_id, recipe_id):
     
     bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
 
+@callback_router.handler('set_rating')
 def handle_set_rating(chat_id, recipe_id, rating):
     """Установить рейтинг для рецепта"""
     if db.update_rating(chat_id, recipe_id, rating):
         # Получаем обновленную информацию о рецепте
         favorite_recipe = db.get_favorite_by_id(chat_id, recipe_id)
-        recipe_name = favorite_recipe.get('strMeal', 'Неизвестное блюдо') if favorite_recipe else 'Рецепт'
+        recipe_name = (favorite_recipe[0].name or 'Неизвестное блюдо') if favorite_recipe else 'Рецепт'
         
         # Формируем звезды нового рейтинга
         stars = "⭐" * rating + "☆" * (5 - rating)
@@ -720,18 +749,25 @@ def handle_set_rating(chat_id, recipe_id, rating):
             reply_markup=markup
         )
 
-def handle_show_more_favorites(chat_id):
-    """Показать больше избранных рецептов"""
-    favorites = db.get_user_favorites(chat_id, limit=50)  # Получаем больше рецептов
+@callback_router.handler('show_more_favorites')
+def handle_show_more_favorites(chat_id, cursor=None, shown=0):
+    """Показать следующую страницу избранных рецептов"""
+    if cursor is None:
+        # Старые кнопки без курсора: пропускаем первую страницу
+        first_page, cursor = db.get_user_favorites_page(chat_id, page_size=10, summary=True)
+        shown = len(first_page)
+        if not first_page:
+            bot.send_message(chat_id, "❌ Нет больше рецептов для показа.")
+            return
     
-    if not favorites:
-        bot.send_message(chat_id, "❌ Нет больше рецептов для показа.")
+    if cursor is None:
+        bot.send_message(chat_id, "✅ Все рецепты уже показаны!")
         return
     
     view_mode = user_view_preferences.get(chat_id, 'cards')
-    
-    # Показываем следующие 10 рецептов (с 10 по 20)
-    next_favorites = favorites[10:20]
+    next_favorites, next_cursor = db.get_user_favorites_page(
+        chat_id, cursor, page_size=10, summary=(view_mode == 'list')
+    )
     
     if not next_favorites:
         bot.send_message(chat_id, "✅ Все рецепты уже показаны!")
@@ -744,8 +780,8 @@ def handle_show_more_favorites(chat_id):
         show_favorites_as_list(chat_id, next_favorites)
     
     # Информация о результатах с кнопками навигации
-    total_count = len(favorites)
-    shown_count = min(20, total_count)
+    total_count = db.get_favorites_count(chat_id)
+    shown_count = shown + len(next_favorites)
     
     info_markup = types.InlineKeyboardMarkup(row_width=2)
     
@@ -758,10 +794,10 @@ def handle_show_more_favorites(chat_id):
         info_markup.add(cards_btn)
     
     # Кнопка показа больше рецептов (если есть)
-    if total_count > 20:
+    if next_cursor:
         more_btn = types.InlineKeyboardButton(
             f"📋 Показано {shown_count} из {total_count}", 
-            callback_data="show_more_favorites"
+            callback_data=callback_router.encode('show_more_favorites', next_cursor, shown_count)
         )
         info_markup.add(more_btn)
     
@@ -773,15 +809,15 @@ def handle_show_more_favorites(chat_id):
 
 # Обработчик текстовых сообщений
 @bot.message_handler(content_types=['text'])
+@timed_handler('message')
 def handle_text_messages(message):
     """Обработчик всех текстовых сообщений"""
     chat_id = message.chat.id
     text = message.text.strip()
     
     # Проверяем состояние пользователя
-    if chat_id in user_states:
-        state = user_states[chat_id]
-        
+    state = user_states.get(chat_id)
+    if state is not None:
         if state == "waiting_for_name":
             del user_states[chat_id]
             perform_search(chat_id, text, "name")
@@ -0,0 +1,263 @@
+import sqlite3
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from config import DATABASE_NAME, CACHE_MAX_ENTRIES
+from sqlite_pool import get_pool
+
+
+def make_cache_key(endpoint, params=None):
+    """Формирует ключ кэша из эндпоинта и параметров запроса"""
+    if not params:
+        return endpoint
+    normalized = sorted((key, str(value).strip()) for key, value in params.items())
+    return f"{endpoint}?{urlencode(normalized)}"
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти с временем жизни записей"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает пару (значение, время истечения) или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        """Сохраняет значение и вытесняет самые старые записи при переполнении"""
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Удаляет запись из кэша"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Очищает кэш"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Дисковый уровень кэша в базе данных бота
+
+    Просроченные записи удаляются при записи, не чаще раза в PURGE_INTERVAL.
+    """
+
+    PURGE_INTERVAL = 60 * 60  # Удаление просроченных записей (в секундах)
+
+    def __init__(self, db_name=DATABASE_NAME):
+        self.db_name = db_name
+        self.pool = get_pool(self.db_name)
+        self._last_purge = 0.0
+        self.init_table()
+
+    def init_table(self):
+        """Создание таблицы кэша ответов API"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS api_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        payload TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка инициализации кэша: {e}")
+
+    def get(self, key):
+        """Возвращает пару (значение, время истечения) или None"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT payload, expires_at FROM api_cache
+                    WHERE cache_key = ? AND expires_at > ?
+                ''', (key, time.time()))
+
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                return json.loads(row[0]), row[1]
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            print(f"❌ Ошибка чтения кэша: {e}")
+            return None
+
+    def set(self, key, value, expires_at):
+        """Сохраняет значение в кэш"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO api_cache (cache_key, payload, expires_at)
+                    VALUES (?, ?, ?)
+                ''', (key, json.dumps(value, ensure_ascii=False), expires_at))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка записи в кэш: {e}")
+
+        if time.time() - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = time.time()
+            self.purge_expired()
+
+    def purge_expired(self):
+        """Удаляет просроченные записи"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM api_cache WHERE expires_at <= ?', (time.time(),))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка очистки кэша: {e}")
+            return 0
+
+
+class TieredCache:
+    """Двухуровневый кэш: LRU в памяти поверх SQLite на диске"""
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk if disk is not None else SQLiteCache()
+        self._stats_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Ищет значение сначала в памяти, затем на диске"""
+        entry = self.memory.get(key)
+        if entry is not None:
+            self._count('memory_hits')
+            return entry[0]
+
+        entry = self.disk.get(key)
+        if entry is not None:
+            # Поднимаем запись в память с оставшимся временем жизни
+            self.memory.set(key, entry[0], entry[1])
+            self._count('disk_hits')
+            return entry[0]
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value, ttl):
+        """Сохраняет значение на оба уровня кэша"""
+        expires_at = time.time() + ttl
+        self.memory.set(key, value, expires_at)
+        self.disk.set(key, value, expires_at)
+
+    def stats(self):
+        """Статистика попаданий и промахов"""
+        with self._stats_lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_size': len(self.memory),
+            }
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+class FileIdCache:
+    """Постоянный кэш соответствия URL изображения и file_id в Telegram
+
+    После первой отправки фото Telegram возвращает file_id, по которому
+    то же изображение можно отправить повторно без скачивания по URL.
+    """
+
+    def __init__(self, db_name=DATABASE_NAME, max_entries=CACHE_MAX_ENTRIES):
+        self.db_name = db_name
+        self.pool = get_pool(self.db_name)
+        self.memory = LRUCache(max_entries)
+        self.init_table()
+
+    def init_table(self):
+        """Создание таблицы file_id"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS telegram_file_ids (
+                        image_url TEXT PRIMARY KEY,
+                        file_id TEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка инициализации кэша file_id: {e}")
+
+    def get(self, image_url):
+        """file_id для URL изображения или None"""
+        entry = self.memory.get(image_url)
+        if entry is not None:
+            return entry[0]
+
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT file_id FROM telegram_file_ids WHERE image_url = ?', (image_url,))
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка чтения кэша file_id: {e}")
+            return None
+
+        if row is None:
+            return None
+        self.memory.set(image_url, row[0], float('inf'))
+        return row[0]
+
+    def set(self, image_url, file_id):
+        """Запоминает file_id для URL изображения"""
+        self.memory.set(image_url, file_id, float('inf'))
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO telegram_file_ids (image_url, file_id)
+                    VALUES (?, ?)
+                ''', (image_url, file_id))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка записи в кэш file_id: {e}")
+
+    def forget(self, image_url):
+        """Удаляет file_id, который Telegram больше не принимает"""
+        self.memory.delete(image_url)
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM telegram_file_ids WHERE image_url = ?', (image_url,))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка удаления из кэша file_id: {e}")
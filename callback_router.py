@@ -0,0 +1,229 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections import namedtuple
+from config import CALLBACK_TOKEN_TTL
+from state_store import MemoryStateStore
+
+# Версия формата callback_data; меняется при несовместимых изменениях
+CALLBACK_VERSION = 1
+# Признак закодированных данных: в старых строковых кнопках этого символа нет
+CALLBACK_PREFIX = '~'
+# Ограничение Telegram на длину callback_data в байтах
+CALLBACK_DATA_LIMIT = 64
+# Флаг в коде маршрута: аргументы кнопки лежат в таблице токенов
+SPILLED_FLAG = 0x80
+TOKEN_SIZE = 6
+
+# Таблица маршрутов: (код, имя, типы параметров)
+# Коды записаны в уже отправленных кнопках, поэтому их нельзя менять или
+# переиспользовать. Имя совпадает со старым строковым форматом кнопки.
+# Типы: 'str', 'int' и 'token' (значение хранится на сервере).
+CALLBACK_ROUTES = (
+    (1, 'search_recipes', ()),
+    (2, 'my_recipes', ()),
+    (3, 'back_to_main', ()),
+    (4, 'search_random', ()),
+    (5, 'search_by_name', ()),
+    (6, 'search_by_ingredient', ()),
+    (7, 'search_by_category', ()),
+    (8, 'view_list', ()),
+    (9, 'view_cards', ()),
+    (10, 'save_recipe', ('str',)),
+    (11, 'view_recipe', ('str',)),
+    (12, 'recipe_details', ('str',)),
+    (13, 'category', ('str',)),
+    (14, 'fav_details', ('str',)),
+    (15, 'remove_fav', ('str',)),
+    (16, 'rate_recipe', ('str',)),
+    (17, 'set_rating', ('str', 'int')),
+    (18, 'show_more_favorites', ('token', 'int')),
+)
+
+Route = namedtuple('Route', 'code name params')
+
+
+def _write_varint(out, number):
+    # zigzag: отрицательные числа тоже занимают мало байт
+    number = (number << 1) ^ (number >> 63)
+    while True:
+        byte = number & 0x7F
+        number >>= 7
+        if number:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    number = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        number |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return (number >> 1) ^ -(number & 1), pos
+
+
+class CallbackRouter:
+    """Маршрутизация нажатий inline кнопок по таблице маршрутов
+
+    Кнопки кодируются компактно: префикс, затем base64 от байтов
+    [версия, код маршрута, аргументы]. Кнопки без параметров остаются
+    строками с именем маршрута. Если данные не помещаются в 64 байта,
+    аргументы сохраняются на сервере, а в кнопку попадает короткий токен.
+    Старые кнопки вида name_arg1_arg2 по-прежнему распознаются.
+    """
+
+    def __init__(self, routes=CALLBACK_ROUTES, tokens=None):
+        self.tokens = tokens if tokens is not None else MemoryStateStore(CALLBACK_TOKEN_TTL)
+        self._by_code = {}
+        self._by_name = {}
+        self._handlers = {}
+        for code, name, params in routes:
+            if not 0 < code < SPILLED_FLAG or code in self._by_code or name in self._by_name:
+                raise ValueError(f"Некорректный маршрут {code}: {name}")
+            route = Route(code, name, tuple(params))
+            self._by_code[code] = route
+            self._by_name[name] = route
+
+    def handler(self, name):
+        """Декоратор: регистрирует обработчик маршрута handler(chat_id, *args)"""
+        if name not in self._by_name:
+            raise KeyError(name)
+
+        def decorator(func):
+            self._handlers[name] = func
+            return func
+        return decorator
+
+    def encode(self, name, *args):
+        """callback_data для кнопки маршрута name с аргументами args"""
+        route = self._by_name[name]
+        if len(args) != len(route.params):
+            raise ValueError(f"Маршрут {name} ожидает {len(route.params)} аргумент(а)")
+        if not route.params:
+            return name
+
+        payload = bytearray((CALLBACK_VERSION, route.code))
+        for kind, value in zip(route.params, args):
+            if kind == 'int':
+                _write_varint(payload, int(value))
+            elif kind == 'token':
+                payload += self._store_token(value)
+            else:
+                encoded = str(value).encode('utf-8')
+                _write_varint(payload, len(encoded))
+                payload += encoded
+
+        data = self._pack(payload)
+        if len(data) > CALLBACK_DATA_LIMIT:
+            data = self._pack(bytes((CALLBACK_VERSION, route.code | SPILLED_FLAG)) + self._store_token(list(args)))
+        return data
+
+    def resolve(self, data):
+        """Маршрут и аргументы кнопки
+
+        Возвращает (None, None) для неизвестной кнопки и (route, None),
+        если аргументы кнопки не удалось восстановить (устарел токен).
+        Старая кнопка с одним именем маршрута дает (route, ()), даже если
+        у маршрута есть параметры: обработчик подставляет значения по умолчанию.
+        """
+        if not data:
+            return None, None
+        if data.startswith(CALLBACK_PREFIX):
+            return self._decode(data)
+        return self._decode_legacy(data)
+
+    def handler_for(self, route):
+        """Обработчик маршрута или None"""
+        return self._handlers.get(route.name) if route is not None else None
+
+    @staticmethod
+    def _pack(payload):
+        return CALLBACK_PREFIX + base64.urlsafe_b64encode(bytes(payload)).decode('ascii').rstrip('=')
+
+    def _store_token(self, value):
+        encoded = json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        token = hashlib.blake2b(encoded.encode('utf-8'), digest_size=TOKEN_SIZE).digest()
+        self.tokens.set(token.hex(), value)
+        return token
+
+    def _load_token(self, token):
+        return self.tokens.get(token.hex())
+
+    def _decode(self, data):
+        text = data[len(CALLBACK_PREFIX):]
+        try:
+            payload = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+        except (binascii.Error, ValueError):
+            return None, None
+        if len(payload) < 2 or payload[0] != CALLBACK_VERSION:
+            return None, None
+
+        route = self._by_code.get(payload[1] & ~SPILLED_FLAG)
+        if route is None:
+            return None, None
+
+        if payload[1] & SPILLED_FLAG:
+            args = self._load_token(payload[2:2 + TOKEN_SIZE])
+            if not isinstance(args, list) or len(args) != len(route.params):
+                return route, None
+            return route, tuple(args)
+
+        try:
+            args = []
+            pos = 2
+            for kind in route.params:
+                if kind == 'int':
+                    value, pos = _read_varint(payload, pos)
+                elif kind == 'token':
+                    if pos + TOKEN_SIZE > len(payload):
+                        return None, None
+                    value = self._load_token(payload[pos:pos + TOKEN_SIZE])
+                    if value is None:
+                        return route, None
+                    pos += TOKEN_SIZE
+                else:
+                    length, pos = _read_varint(payload, pos)
+                    if length < 0 or pos + length > len(payload):
+                        return None, None
+                    value = payload[pos:pos + length].decode('utf-8')
+                    pos += length
+                args.append(value)
+        except (IndexError, UnicodeDecodeError):
+            return None, None
+        return route, tuple(args)
+
+    def _decode_legacy(self, data):
+        """Разбор старых кнопок вида name или name_параметры"""
+        route = self._by_name.get(data)
+        if route is not None:
+            return route, ()
+
+        # Имена маршрутов содержат подчеркивания: проверяем каждый префикс
+        index = data.find('_')
+        while index != -1:
+            route = self._by_name.get(data[:index])
+            if route is not None and route.params:
+                break
+            index = data.find('_', index + 1)
+        else:
+            return None, None
+
+        try:
+            return route, self._parse_legacy(route, data[index + 1:])
+        except ValueError:
+            return route, None
+
+    @staticmethod
+    def _parse_legacy(route, rest):
+        # Параметры разбираются справа: идентификатор может содержать "_"
+        parts = rest.rsplit('_', len(route.params) - 1)
+        if len(parts) != len(route.params) or not parts[0]:
+            raise ValueError(rest)
+        return tuple(int(part) if kind == 'int' else part for kind, part in zip(route.params, parts))
@@ -0,0 +1,233 @@
+import sqlite3
+import json
+import string
+import threading
+import time
+import requests
+from config import DATABASE_NAME, CATALOG_REFRESH_INTERVAL
+from sqlite_pool import get_pool
+from models import Meal
+from search_index import IngredientIndex, NameIndex, normalize_term
+
+# TheMealDB перечисляет рецепты по первому символу названия
+SYNC_LETTERS = string.ascii_lowercase + string.digits
+
+
+class MealCatalog:
+    """Локальное зеркало каталога TheMealDB с поиском в памяти
+
+    Рецепты хранятся в таблице catalog_meals и загружаются в память при
+    старте, поэтому поиск не требует обращения ни к сети, ни к диску.
+    Пока ни одна синхронизация не прошла полностью, зеркало считается
+    неполным (is_complete), и клиент перепроверяет результаты в API.
+    """
+
+    def __init__(self, db_name=DATABASE_NAME):
+        self.db_name = db_name
+        self.pool = get_pool(self.db_name)
+        self._sync_lock = threading.Lock()
+        self._meals = {}
+        self._by_category = {}
+        self._ingredients = IngredientIndex()
+        self._names = NameIndex()
+        self.last_sync = None
+        self.last_complete_sync = None
+        self.init_table()
+        self.load()
+
+    def init_table(self):
+        """Создание таблицы зеркала каталога"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS catalog_meals (
+                        meal_id TEXT PRIMARY KEY,
+                        meal_data TEXT NOT NULL,
+                        synced_at REAL NOT NULL
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS catalog_sync (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        completed_at REAL NOT NULL
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка инициализации каталога: {e}")
+
+    def load(self):
+        """Загружает зеркало из базы данных в память"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT meal_data, synced_at FROM catalog_meals')
+
+                meals = {}
+                last_sync = None
+                for meal_data, synced_at in cursor.fetchall():
+                    meal = Meal.from_api(json.loads(meal_data))
+                    meals[meal.id] = meal
+                    last_sync = max(last_sync or synced_at, synced_at)
+
+                cursor.execute('SELECT completed_at FROM catalog_sync WHERE id = 1')
+                row = cursor.fetchone()
+
+                self._publish(meals)
+                self.last_sync = last_sync
+                self.last_complete_sync = row[0] if row is not None else None
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            print(f"❌ Ошибка загрузки каталога: {e}")
+
+    def _publish(self, meals):
+        """Атомарно подменяет данные, по которым выполняется поиск"""
+        by_category = {}
+        for meal in meals.values():
+            by_category.setdefault(normalize_term(meal.category), []).append(meal)
+
+        self._ingredients = IngredientIndex.build(meals.values())
+        self._names = NameIndex.build(meals.values())
+        self._meals = meals
+        self._by_category = by_category
+
+    def is_ready(self):
+        """Есть ли в зеркале данные для ответа на запросы"""
+        return bool(self._meals)
+
+    def is_complete(self):
+        """Прошла ли хотя бы одна полная синхронизация"""
+        return self.last_complete_sync is not None
+
+    def __len__(self):
+        return len(self._meals)
+
+    def is_stale(self, max_age=CATALOG_REFRESH_INTERVAL):
+        """Пора ли обновлять зеркало"""
+        return self.last_sync is None or time.time() - self.last_sync > max_age
+
+    def sync(self, client):
+        """Синхронизирует зеркало с TheMealDB
+
+        Каталог перечисляется через search.php?f=, а рецепты, пропавшие из
+        перечисления, перепроверяются через lookup.php. В базу записываются
+        только изменившиеся рецепты. Возвращает количество изменений.
+        """
+        with self._sync_lock:
+            fetched = {}
+            complete = True
+
+            for letter in SYNC_LETTERS:
+                try:
+                    for meal in client.search_by_first_letter(letter):
+                        fetched[meal.id] = meal
+                except requests.exceptions.RequestException as e:
+                    print(f"Ошибка синхронизации каталога ({letter}): {e}")
+                    complete = False
+
+            missing = []
+            for meal_id in set(self._meals) - set(fetched):
+                try:
+                    meal = client.lookup_meal(meal_id)
+                except requests.exceptions.RequestException as e:
+                    print(f"Ошибка проверки рецепта {meal_id}: {e}")
+                    meal = None
+                    complete = False
+
+                if meal:
+                    fetched[meal_id] = meal
+                else:
+                    missing.append(meal_id)
+
+            removed = []
+            if complete:
+                removed = missing
+            else:
+                # При неполной синхронизации ничего не удаляем
+                for meal_id in missing:
+                    fetched[meal_id] = self._meals[meal_id]
+
+            if not fetched:
+                print("⚠️ Каталог не синхронизирован: TheMealDB недоступен")
+                return 0
+
+            changed = [meal for meal_id, meal in fetched.items() if self._meals.get(meal_id) != meal]
+            now = time.time()
+
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany('''
+                        INSERT OR REPLACE INTO catalog_meals (meal_id, meal_data, synced_at)
+                        VALUES (?, ?, ?)
+                    ''', [(meal.id, json.dumps(meal.to_dict(), ensure_ascii=False), now) for meal in changed])
+                    cursor.executemany('DELETE FROM catalog_meals WHERE meal_id = ?',
+                                       [(meal_id,) for meal_id in removed])
+                    cursor.execute('UPDATE catalog_meals SET synced_at = ?', (now,))
+                    if complete:
+                        cursor.execute(
+                            'INSERT OR REPLACE INTO catalog_sync (id, completed_at) VALUES (1, ?)', (now,)
+                        )
+                    conn.commit()
+            except sqlite3.Error as e:
+                print(f"❌ Ошибка сохранения каталога: {e}")
+                return 0
+
+            self._publish(fetched)
+            self.last_sync = now
+            if complete:
+                self.last_complete_sync = now
+
+            print(f"📚 Каталог синхронизирован: {len(fetched)} рецептов, "
+                  f"изменено {len(changed)}, удалено {len(removed)}")
+            return len(changed) + len(removed)
+
+    def start_background_refresh(self, client, interval=CATALOG_REFRESH_INTERVAL):
+        """Запускает фоновый поток, который поддерживает зеркало актуальным"""
+        thread = threading.Thread(
+            target=self._refresh_loop, args=(client, interval), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _refresh_loop(self, client, interval):
+        while True:
+            if self.is_stale(interval):
+                self.sync(client)
+
+            next_sync = (self.last_sync or time.time()) + interval
+            time.sleep(max(60, next_sync - time.time()))
+
+    def get_meal(self, meal_id):
+        """Рецепт по ID или None"""
+        return self._meals.get(str(meal_id))
+
+    def search_by_name(self, name):
+        """Рецепты, в названии которых встречается строка"""
+        query = (name or '').strip().lower()
+        if not query:
+            return []
+        return [meal for meal in self._meals.values() if query in (meal.name or '').lower()]
+
+    def fuzzy_search_by_name(self, name, limit=10):
+        """Рецепты с похожими названиями с учетом опечаток и неполных слов"""
+        meals = self._meals
+        return [meals[meal_id] for meal_id, _ in self._names.search(name, limit) if meal_id in meals]
+
+    def search_by_ingredient(self, ingredient):
+        """Рецепты, содержащие ингредиент"""
+        meals = self._meals
+        return [meals[meal_id] for meal_id in sorted(self._ingredients.lookup(ingredient)) if meal_id in meals]
+
+    def search_by_ingredients(self, ingredients, match_all=True):
+        """Рецепты по нескольким ингредиентам, упорядоченные по покрытию"""
+        meals = self._meals
+        return [
+            meals[meal_id]
+            for meal_id, _ in self._ingredients.search(ingredients, match_all)
+            if meal_id in meals
+        ]
+
+    def filter_by_category(self, category):
+        """Рецепты из категории"""
+        return list(self._by_category.get(normalize_term(category), []))
@@ -10,10 +10,10 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
 # API настройки для TheMealDB
-MEAL_DB_BASE_URL = "https://www.themealdb.com/api/json/v1/1"
+MEAL_DB_BASE_URL = os.getenv('MEAL_DB_BASE_URL', "https://www.themealdb.com/api/json/v1/1")
 
 # Настройки базы данных
-DATABASE_NAME = "recipes_bot.db"
+DATABASE_NAME = os.getenv('DATABASE_NAME', "recipes_bot.db")
 
 # Настройки API (если понадобятся другие сервисы)
 EDAMAM_APP_ID = os.getenv('EDAMAM_APP_ID', '')
@@ -22,3 +22,86 @@ EDAMAM_APP_KEY = os.getenv('EDAMAM_APP_KEY', '')
 # Лимиты
 MAX_RECIPES_PER_SEARCH = 10
 MAX_FAVORITES_PER_USER = 100
+
+# Настройки кэша ответов TheMealDB
+CACHE_MAX_ENTRIES = 1000  # Максимум записей в памяти
+CACHE_TTL = {  # Время жизни записей по эндпоинтам (в секундах)
+    "search.php": 60 * 60,
+    "filter.php": 60 * 60,
+    "lookup.php": 24 * 60 * 60,
+    "categories.php": 7 * 24 * 60 * 60,
+}
+
+# Настройки HTTP-сессии для TheMealDB
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))  # Соединений в пуле
+HTTP_CONNECT_TIMEOUT = 3.05  # Таймаут установки соединения (в секундах)
+HTTP_READ_TIMEOUT = 10  # Таймаут чтения ответа (в секундах)
+HTTP_MAX_RETRIES = 3  # Повторы при 5xx и таймаутах
+HTTP_BACKOFF_FACTOR = 0.5  # Множитель экспоненциальной задержки между повторами
+
+# Параллельная загрузка деталей рецептов
+DETAILS_FANOUT_CONCURRENCY = 5  # Одновременных запросов lookup.php
+
+# Локальное зеркало каталога TheMealDB
+CATALOG_ENABLED = os.getenv('CATALOG_ENABLED', '1') == '1'
+CATALOG_REFRESH_INTERVAL = 24 * 60 * 60  # Период обновления зеркала (в секундах)
+
+# Нечеткий поиск по названию
+FUZZY_MAX_DISTANCE = 2  # Максимум опечаток в одном слове запроса
+
+# Настройки соединений SQLite
+SQLITE_BUSY_TIMEOUT = 5.0  # Ожидание блокировки базы (в секундах)
+SQLITE_CACHED_STATEMENTS = 128  # Размер кэша подготовленных выражений на соединение
+
+# Формат хранения данных рецептов: 'json', 'zlib' или 'zlib_dict'
+RECIPE_CODEC = 'zlib_dict'
+
+# Отправка карточек рецептов: 'sequential', 'parallel' или 'media_group'
+CARD_DELIVERY_MODE = os.getenv('CARD_DELIVERY_MODE', 'parallel')
+CARD_DELIVERY_WORKERS = 5  # Параллельных загрузок фото
+
+# Ограничение скорости исходящих сообщений (лимиты Telegram)
+OUTBOUND_PER_CHAT_RATE = 1.0  # Сообщений в секунду в один чат
+OUTBOUND_PER_CHAT_BURST = 3  # Допустимая короткая пачка сообщений в чат
+OUTBOUND_GLOBAL_RATE = 30.0  # Сообщений в секунду для всего бота
+OUTBOUND_GLOBAL_BURST = 30  # Допустимая пачка сообщений для всего бота
+OUTBOUND_WORKERS = 8  # Одновременных запросов к Telegram
+OUTBOUND_MAX_RETRIES = 3  # Повторов после ответа 429
+
+# Режим получения обновлений: 'polling' или 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публичный адрес сервера, например https://bot.example.com
+WEBHOOK_PATH = '/webhook'
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # Обязателен для webhook; проверяется по заголовку X-Telegram-Bot-Api-Secret-Token
+
+# Параллельная обработка обновлений (порядок внутри чата сохраняется)
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))  # Потоков обработки обновлений
+UPDATE_MAX_PENDING = 200  # Обновлений в очереди и в обработке; сверх - ожидание или 503
+UPDATE_MAX_PENDING_PER_CHAT = 20  # Необработанных обновлений одного чата; сверх - пропуск
+
+# Хранилище состояний пользователей: 'memory' или 'sqlite'
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')
+STATE_MAX_ENTRIES = 100_000  # Записей в памяти для backend 'memory'
+STATE_FLUSH_INTERVAL = 1.0  # Период отложенной записи в SQLite (в секундах)
+USER_STATE_TTL = 60 * 60  # Время ожидания ввода пользователя (в секундах)
+VIEW_PREFERENCE_TTL = 90 * 24 * 60 * 60  # Хранение выбранного вида избранного (в секундах)
+
+# Кэш отрисованных карточек рецептов
+RENDER_CACHE_MAX_ENTRIES = 2000  # Рецептов в кэше
+MESSAGE_CHUNK_SIZE = 4000  # Максимальная длина части длинного сообщения
+
+# Кнопки: данные, не помещающиеся в callback_data, хранятся на сервере
+CALLBACK_TOKEN_TTL = 30 * 24 * 60 * 60  # Срок жизни таких кнопок (в секундах)
+
+# Запас случайных рецептов, пополняемый в фоне
+RANDOM_POOL_SIZE = 30  # Рецептов в запасе
+RANDOM_POOL_LOW_WATER = 10  # Пополнение начинается, когда рецептов меньше
+RANDOM_POOL_SEEN_PER_CHAT = 50  # Сколько последних показанных рецептов чата не повторяются
+RANDOM_POOL_SEEN_TTL = 24 * 60 * 60  # Сколько помнить показанные чату рецепты (в секундах)
+RANDOM_POOL_RETRY_DELAY = 5.0  # Пауза после неудачного пополнения (в секундах)
+RANDOM_POOL_FALLBACK_ATTEMPTS = 3  # Запросов к API, если в запасе нет нового для чата рецепта
+
+# Предзагрузка деталей рецептов, показанных в результатах поиска
+PREFETCH_WORKERS = 2  # Потоков предзагрузки
+PREFETCH_MAX_PENDING = 100  # Рецептов в очереди; сверх - не предзагружаются
+PREFETCH_PER_CHAT = 5  # Рецептов одного чата в очереди и в работе
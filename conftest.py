@@ -0,0 +1 @@
+# Корень проекта: тесты импортируют модули бота напрямую
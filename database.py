@@ -1,19 +1,65 @@
 import sqlite3
-import json
 from datetime import datetime
 from config import DATABASE_NAME
+from collections.abc import Mapping
+from sqlite_pool import get_pool
+from recipe_codec import encode_recipe, decode_recipe
+from models import Meal
+from metrics import DB_SECONDS, timed_method
+
+# Колонки избранного: полные записи и облегченная проекция без recipe_data.
+# Данные рецепта хранятся один раз в таблице recipes; непустой
+# favorites.recipe_data остается только у записей до миграции.
+FAVORITE_COLUMNS = '''f.id, f.recipe_id, f.recipe_name,
+                      COALESCE(r.recipe_data, NULLIF(f.recipe_data, '')),
+                      f.image_url, f.category, f.area, f.rating, f.saved_at'''
+SUMMARY_COLUMNS = '''f.id, f.recipe_id, f.recipe_name, NULL,
+                     f.image_url, f.category, f.area, f.rating, f.saved_at'''
+
+class LazyRecipeData(Mapping):
+    """Рецепт (Meal), который декодируется только при первом обращении"""
+    
+    __slots__ = ('_raw', '_data')
+    
+    def __init__(self, raw):
+        self._raw = raw
+        self._data = None
+    
+    def _decoded(self):
+        if self._data is None:
+            try:
+                self._data = Meal.from_api(decode_recipe(self._raw))
+            except ValueError:
+                self._data = {}
+            self._raw = None
+        return self._data
+    
+    def to_meal(self):
+        """Декодированный рецепт; None, если данные повреждены"""
+        meal = self._decoded()
+        return meal if isinstance(meal, Meal) else None
+    
+    def __getitem__(self, key):
+        return self._decoded()[key]
+    
+    def __iter__(self):
+        return iter(self._decoded())
+    
+    def __len__(self):
+        return len(self._decoded())
 
 class RecipeDatabase:
     """Класс для работы с базой данных избранных рецептов"""
     
     def __init__(self):
         self.db_name = DATABASE_NAME
+        self.pool = get_pool(self.db_name)
         self.init_database()
     
     def init_database(self):
         """Инициализация базы данных и создание таблиц"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 # Создаем таблицу для избранных рецептов
@@ -48,32 +94,59 @@ class RecipeDatabase:
                     cursor.execute('ALTER TABLE favorites ADD COLUMN rating INTEGER DEFAULT 0')
                     print("🔧 Добавлена колонка rating к существующей таблице")
                 
+                # Общая таблица рецептов: одна копия данных на рецепт
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS recipes (
+                        recipe_id TEXT PRIMARY KEY,
+                        recipe_data TEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Составной индекс для постраничного вывода избранного по курсору
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_favorites_user_page 
+                    ON favorites(user_id, rating DESC, saved_at DESC, id DESC)
+                ''')
+                
                 conn.commit()
                 print("🗄️ База данных инициализирована")
                 
         except sqlite3.Error as e:
             print(f"❌ Ошибка инициализации базы данных: {e}")
     
+    @timed_method(DB_SECONDS)
     def add_favorite(self, user_id, recipe_data):
-        """Добавить рецепт в избранное"""
+        """Добавить рецепт (Meal или словарь TheMealDB) в избранное"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
-                recipe_id = recipe_data.get('idMeal')
-                recipe_name = recipe_data.get('strMeal', 'Неизвестное блюдо')
-                image_url = recipe_data.get('strMealThumb', '')
-                category = recipe_data.get('strCategory', '')
-                area = recipe_data.get('strArea', '')
+                meal = Meal.coerce(recipe_data)
+                recipe_id = meal.id
+                recipe_name = meal.name or 'Неизвестное блюдо'
+                image_url = meal.thumb or ''
+                category = meal.category or ''
+                area = meal.area or ''
                 
-                # Сохраняем полные данные рецепта в JSON
-                recipe_json = json.dumps(recipe_data, ensure_ascii=False)
+                # Сохраняем данные рецепта в компактном виде (одна копия на рецепт)
+                recipe_payload = encode_recipe(meal.to_dict())
                 
+                cursor.execute('''
+                    INSERT INTO recipes (recipe_id, recipe_data)
+                    VALUES (?, ?)
+                    ON CONFLICT(recipe_id) DO UPDATE SET 
+                        recipe_data = excluded.recipe_data,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE recipe_data != excluded.recipe_data
+                ''', (recipe_id, recipe_payload))
+                
+                # В избранном остается только ссылка на рецепт
                 cursor.execute('''
                     INSERT OR REPLACE INTO favorites 
                     (user_id, recipe_id, recipe_name, recipe_data, image_url, category, area, rating)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-                ''', (user_id, recipe_id, recipe_name, recipe_json, image_url, category, area))
+                    VALUES (?, ?, ?, '', ?, ?, ?, 0)
+                ''', (user_id, recipe_id, recipe_name, image_url, category, area))
                 
                 conn.commit()
                 return True
@@ -82,70 +155,124 @@ class RecipeDatabase:
             print(f"❌ Ошибка добавления в избранное: {e}")
             return False
     
+    @timed_method(DB_SECONDS)
     def remove_favorite(self, user_id, recipe_id):
         """Удалить рецепт из избранного"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
                     DELETE FROM favorites 
                     WHERE user_id = ? AND recipe_id = ?
                 ''', (user_id, recipe_id))
+                removed = cursor.rowcount > 0
                 
+                if removed:
+                    self._delete_orphan_recipes(cursor, recipe_id)
                 conn.commit()
-                return cursor.rowcount > 0
+                return removed
                 
         except sqlite3.Error as e:
             print(f"❌ Ошибка удаления из избранного: {e}")
             return False
     
-    def get_user_favorites(self, user_id, limit=50):
-        """Получить все избранные рецепты пользователя"""
+    @timed_method(DB_SECONDS)
+    def get_user_favorites(self, user_id, limit=50, summary=False):
+        """Получить все избранные рецепты пользователя
+        
+        При summary=True возвращаются только краткие данные (без recipe_data).
+        """
+        columns = SUMMARY_COLUMNS if summary else FAVORITE_COLUMNS
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute('''
-                    SELECT recipe_id, recipe_name, recipe_data, image_url, 
-                           category, area, rating, saved_at
-                    FROM favorites 
-                    WHERE user_id = ? 
-                    ORDER BY rating DESC, saved_at DESC 
+                cursor.execute(f'''
+                    SELECT {columns}
+                    FROM favorites f
+                    LEFT JOIN recipes r ON r.recipe_id = f.recipe_id
+                    WHERE f.user_id = ? 
+                    ORDER BY f.rating DESC, f.saved_at DESC, f.id DESC 
                     LIMIT ?
                 ''', (user_id, limit))
                 
-                favorites = []
-                for row in cursor.fetchall():
-                    recipe_id, recipe_name, recipe_data, image_url, category, area, rating, saved_at = row
-                    
-                    # Восстанавливаем данные рецепта из JSON
-                    try:
-                        recipe_json = json.loads(recipe_data)
-                    except json.JSONDecodeError:
-                        recipe_json = {}
-                    
-                    favorites.append({
-                        'recipe_id': recipe_id,
-                        'recipe_name': recipe_name,
-                        'recipe_data': recipe_json,
-                        'image_url': image_url,
-                        'category': category,
-                        'area': area,
-                        'rating': rating,
-                        'saved_at': saved_at
-                    })
-                
-                return favorites
+                return [self._row_to_favorite(row) for row in cursor.fetchall()]
                 
         except sqlite3.Error as e:
             print(f"❌ Ошибка получения избранного: {e}")
             return []
     
+    @timed_method(DB_SECONDS)
+    def get_user_favorites_page(self, user_id, cursor=None, page_size=10, summary=False):
+        """Получить страницу избранных рецептов по курсору
+        
+        Курсор - кортеж (rating, saved_at, id) последней показанной записи,
+        None для первой страницы. Возвращает пару (рецепты, курсор следующей
+        страницы или None, если страниц больше нет). Благодаря индексу
+        idx_favorites_user_page любая страница стоит столько же, сколько первая.
+        При summary=True возвращаются только краткие данные (без recipe_data).
+        """
+        columns = SUMMARY_COLUMNS if summary else FAVORITE_COLUMNS
+        try:
+            with self.pool.connection() as conn:
+                db_cursor = conn.cursor()
+                
+                if cursor is None:
+                    db_cursor.execute(f'''
+                        SELECT {columns}
+                        FROM favorites f
+                        LEFT JOIN recipes r ON r.recipe_id = f.recipe_id
+                        WHERE f.user_id = ? 
+                        ORDER BY f.rating DESC, f.saved_at DESC, f.id DESC 
+                        LIMIT ?
+                    ''', (user_id, page_size + 1))
+                else:
+                    db_cursor.execute(f'''
+                        SELECT {columns}
+                        FROM favorites f
+                        LEFT JOIN recipes r ON r.recipe_id = f.recipe_id
+                        WHERE f.user_id = ? AND (f.rating, f.saved_at, f.id) < (?, ?, ?)
+                        ORDER BY f.rating DESC, f.saved_at DESC, f.id DESC 
+                        LIMIT ?
+                    ''', (user_id, *cursor, page_size + 1))
+                
+                rows = db_cursor.fetchall()
+                
+                next_cursor = None
+                if len(rows) > page_size:
+                    rows = rows[:page_size]
+                    last = rows[-1]
+                    next_cursor = (last[7], last[8], last[0])
+                
+                return [self._row_to_favorite(row) for row in rows], next_cursor
+                
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка получения страницы избранного: {e}")
+            return [], None
+    
+    @staticmethod
+    def _row_to_favorite(row):
+        """Преобразует строку таблицы favorites в словарь"""
+        _, recipe_id, recipe_name, recipe_data, image_url, category, area, rating, saved_at = row
+        
+        return {
+            'recipe_id': recipe_id,
+            'recipe_name': recipe_name,
+            # Данные рецепта декодируются только при обращении к ним
+            'recipe_data': LazyRecipeData(recipe_data) if recipe_data is not None else None,
+            'image_url': image_url,
+            'category': category,
+            'area': area,
+            'rating': rating,
+            'saved_at': saved_at
+        }
+    
+    @timed_method(DB_SECONDS)
     def is_favorite(self, user_id, recipe_id):
         """Проверить, есть ли рецепт в избранном у пользователя"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -159,10 +286,11 @@ class RecipeDatabase:
             print(f"❌ Ошибка проверки избранного: {e}")
             return False
     
+    @timed_method(DB_SECONDS)
     def get_favorites_count(self, user_id):
         """Получить количество избранных рецептов пользователя"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -176,24 +304,25 @@ class RecipeDatabase:
             print(f"❌ Ошибка подсчета избранного: {e}")
             return 0
     
+    @timed_method(DB_SECONDS)
     def get_favorite_by_id(self, user_id, recipe_id):
-        """Получить конкретный избранный рецепт"""
+        """Получить конкретный избранный рецепт: пару (Meal, рейтинг) или None"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
-                    SELECT recipe_data, rating FROM favorites 
-                    WHERE user_id = ? AND recipe_id = ?
+                    SELECT COALESCE(r.recipe_data, NULLIF(f.recipe_data, '')), f.rating 
+                    FROM favorites f
+                    LEFT JOIN recipes r ON r.recipe_id = f.recipe_id
+                    WHERE f.user_id = ? AND f.recipe_id = ?
                 ''', (user_id, recipe_id))
                 
                 result = cursor.fetchone()
-                if result:
+                if result and result[0]:
                     try:
-                        recipe_data = json.loads(result[0])
-                        recipe_data['rating'] = result[1]  # Добавляем рейтинг к данным рецепта
-                        return recipe_data
-                    except json.JSONDecodeError:
+                        return Meal.from_api(decode_recipe(result[0])), result[1]
+                    except ValueError:
                         return None
                 return None
                 
@@ -201,10 +330,11 @@ class RecipeDatabase:
             print(f"❌ Ошибка получения рецепта: {e}")
             return None
     
+    @timed_method(DB_SECONDS)
     def update_rating(self, user_id, recipe_id, rating):
         """Обновить рейтинг рецепта"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -220,18 +350,22 @@ class RecipeDatabase:
             print(f"❌ Ошибка обновления рейтинга: {e}")
             return False
     
+    @timed_method(DB_SECONDS)
     def cleanup_old_favorites(self, days=365):
         """Очистка старых избранных рецептов (старше указанного количества дней)"""
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
                     DELETE FROM favorites 
-                    WHERE saved_at < datetime('now', '-{} days')
-                '''.format(days))
+                    WHERE saved_at < datetime('now', ?)
+                ''', (f'-{int(days)} days',))
                 
                 deleted_count = cursor.rowcount
+                
+                # Удаляем рецепты, которые больше никто не хранит в избранном
+                self._delete_orphan_recipes(cursor)
                 conn.commit()
                 
                 if deleted_count > 0:
@@ -242,6 +376,25 @@ class RecipeDatabase:
         except sqlite3.Error as e:
             print(f"❌ Ошибка очистки базы данных: {e}")
             return 0
+    
+    @staticmethod
+    def _delete_orphan_recipes(cursor, recipe_id=None):
+        """Удаляет из recipes рецепты без ссылок из избранного
+        
+        С recipe_id проверяется только этот рецепт.
+        """
+        if recipe_id is not None:
+            cursor.execute('''
+                DELETE FROM recipes
+                WHERE recipe_id = ? AND NOT EXISTS (SELECT 1 FROM favorites WHERE recipe_id = ?)
+            ''', (recipe_id, recipe_id))
+            return cursor.rowcount
+        
+        cursor.execute('''
+            DELETE FROM recipes 
+            WHERE recipe_id NOT IN (SELECT recipe_id FROM favorites)
+        ''')
+        return cursor.rowcount
 
 # Глобальный экземпляр базы данных
 db = RecipeDatabase()
@@ -0,0 +1,220 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from telebot import types
+from config import CARD_DELIVERY_MODE, CARD_DELIVERY_WORKERS, HTTP_READ_TIMEOUT
+from outbound import get_retry_after, wait_result
+
+# Ограничение Telegram на длину подписи к фото
+CAPTION_LIMIT = 1024
+# Описания ошибок Telegram для недействительного file_id
+STALE_FILE_ID_ERRORS = ('wrong file identifier', 'file reference', 'file_reference')
+# Символы сущностей Markdown, которые нужно закрыть после обрезки
+MARKDOWN_MARKERS = '*_`'
+
+
+def is_stale_file_id_error(error):
+    """Отклонил ли Telegram сохраненный file_id (ошибка 400 о файле)"""
+    if getattr(error, 'error_code', None) != 400:
+        return False
+    description = str(getattr(error, 'description', '') or '').lower()
+    return any(marker in description for marker in STALE_FILE_ID_ERRORS)
+
+
+def truncate_markdown(text, limit):
+    """Обрезает текст с разметкой Markdown по границе слова
+
+    Незакрытые *, _ и ` закрываются, а недописанная ссылка отбрасывается,
+    чтобы Telegram смог разобрать разметку.
+    """
+    if len(text) <= limit:
+        return text
+
+    # Место под многоточие и закрывающие символы
+    budget = limit - 3 - len(MARKDOWN_MARKERS)
+    cut = max(text.rfind(' ', 0, budget), text.rfind('\n', 0, budget))
+    head = text[:cut if cut > 0 else budget].rstrip()
+
+    link_start = head.rfind('[')
+    if link_start != -1 and ')' not in head[link_start:]:
+        head = head[:link_start].rstrip()
+
+    open_markers = []
+    for char in head:
+        if open_markers and open_markers[-1] == '`':
+            # Внутри кода остальные символы разметки не действуют
+            if char == '`':
+                open_markers.pop()
+        elif char in MARKDOWN_MARKERS:
+            if char in open_markers:
+                while open_markers.pop() != char:
+                    pass
+            else:
+                open_markers.append(char)
+
+    return head + "..." + ''.join(reversed(open_markers))
+
+
+class CardDelivery:
+    """Отправка набора карточек рецептов в чат с сохранением порядка
+
+    Режимы:
+    - sequential: карточки отправляются по очереди, Telegram сам скачивает фото;
+    - parallel: фото скачиваются параллельно через пул потоков и общий
+      HTTP-пул, а каждая карточка ставится в очередь отправки, как только
+      готово ее фото (порядок сохраняет очередь чата);
+    - media_group: все фото уходят одним вызовом send_media_group, кнопки
+      всех карточек собираются в одно сообщение после альбома.
+    """
+
+    def __init__(self, bot, http_session=None, file_ids=None, mode=CARD_DELIVERY_MODE,
+                 max_workers=CARD_DELIVERY_WORKERS):
+        self.bot = bot
+        self.http_session = http_session
+        self.file_ids = file_ids
+        self.mode = mode
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='card-delivery')
+
+    def deliver(self, chat_id, cards):
+        """Отправляет карточки - список кортежей (текст, URL фото, клавиатура)
+
+        Карточки - массовая отправка, поэтому они уступают очередь
+        интерактивным ответам других пользователей.
+        """
+        with self._bulk():
+            self._deliver(chat_id, cards)
+
+    def _bulk(self):
+        outbound = getattr(self.bot, 'outbound', None)
+        return outbound.bulk() if outbound is not None else nullcontext()
+
+    def _deliver(self, chat_id, cards):
+        if self.mode == 'media_group' and len(cards) > 1:
+            if self._deliver_media_group(chat_id, cards):
+                return
+        elif self.mode == 'parallel' and self.http_session is not None:
+            self._deliver_parallel(chat_id, cards)
+            return
+
+        for text, image_url, markup in cards:
+            self.send_card(chat_id, text, image_url, markup)
+
+    def send_card(self, chat_id, text, image_url, markup, photo=None):
+        """Отправляет одну карточку; при ошибке - текстом без разметки
+
+        photo - уже скачанное изображение; если не передано, Telegram
+        скачивает фото по image_url сам. Если фото уже отправлялось раньше,
+        используется сохраненный file_id. Если бот отправляет через очередь,
+        карточка (вместе с запасными вариантами) ставится в нее одним
+        заданием и метод не ждет отправки.
+        """
+        submit = getattr(self.bot, 'submit', None)
+        if submit is not None:
+            return submit(chat_id, self._send_card_now, chat_id, text, image_url, markup, photo)
+
+        try:
+            return self._send_card_now(self.bot, chat_id, text, image_url, markup, photo)
+        except Exception as e:
+            print(f"Ошибка отправки рецепта: {e}")
+            return None
+
+    def _send_card_now(self, api, chat_id, text, image_url, markup, photo=None):
+        """Отправка карточки через api без очереди"""
+        try:
+            if image_url:
+                return self._send_photo(api, chat_id, text, image_url, markup, photo)
+            return api.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
+        except Exception as e:
+            if get_retry_after(e) is not None:
+                # Повтор текстом только усилит поток запросов при флуд-лимите;
+                # очередь сама повторит задание после паузы
+                raise
+            print(f"Ошибка отправки рецепта: {e}")
+            return api.send_message(chat_id, text, reply_markup=markup)
+
+    def _send_photo(self, api, chat_id, text, image_url, markup, photo=None):
+        """Отправляет фото, по возможности по сохраненному file_id"""
+        file_id = self._cached_file_id(image_url)
+        if file_id:
+            try:
+                return api.send_photo(chat_id, file_id, caption=text, reply_markup=markup, parse_mode='Markdown')
+            except Exception as e:
+                if not is_stale_file_id_error(e):
+                    raise
+                print(f"Сохраненный file_id для {image_url} недействителен: {e}")
+                self.file_ids.forget(image_url)
+
+        message = api.send_photo(chat_id, photo or image_url, caption=text, reply_markup=markup, parse_mode='Markdown')
+        self._remember_file_id(image_url, message)
+        return message
+
+    def _cached_file_id(self, image_url):
+        return self.file_ids.get(image_url) if self.file_ids is not None and image_url else None
+
+    def _remember_file_id(self, image_url, message):
+        """Сохраняет file_id самого большого размера фото из ответа Telegram"""
+        if self.file_ids is not None and message is not None and getattr(message, 'photo', None):
+            self.file_ids.set(image_url, message.photo[-1].file_id)
+
+    def _deliver_parallel(self, chat_id, cards):
+        """Параллельно скачивает фото и по порядку ставит карточки в отправку"""
+        # Фото с известным file_id скачивать не нужно
+        downloads = [
+            self.executor.submit(self._download_image, image_url)
+            if image_url and not self._cached_file_id(image_url) else None
+            for _, image_url, _ in cards
+        ]
+
+        for (text, image_url, markup), download in zip(cards, downloads):
+            photo = download.result() if download else None
+            self.send_card(chat_id, text, image_url, markup, photo=photo)
+
+    def _download_image(self, image_url):
+        """Скачивает фото; при ошибке возвращает None (отправим по URL)"""
+        try:
+            response = self.http_session.get(image_url, timeout=HTTP_READ_TIMEOUT)
+            response.raise_for_status()
+            return response.content
+        except Exception as e:
+            print(f"Ошибка загрузки фото {image_url}: {e}")
+            return None
+
+    def _deliver_media_group(self, chat_id, cards):
+        """Отправляет фото альбомом, а кнопки - одним сообщением после него
+
+        Возвращает False, если альбом не удалось отправить и стоит
+        отправить карточки по одной.
+        """
+        if len(cards) > 10:  # Telegram принимает в альбоме до 10 фото
+            return False
+
+        media = []
+        combined_markup = types.InlineKeyboardMarkup()
+
+        for number, (text, image_url, markup) in enumerate(cards, 1):
+            if not image_url:
+                return False
+
+            caption = truncate_markdown(f"{number}. {text}", CAPTION_LIMIT)
+            media.append(types.InputMediaPhoto(
+                self._cached_file_id(image_url) or image_url, caption=caption, parse_mode='Markdown'
+            ))
+
+            # Кнопки каждой карточки помечаем ее номером в альбоме
+            for row in markup.keyboard if markup else []:
+                combined_markup.row(*[
+                    types.InlineKeyboardButton(f"{number}. {button.text}", callback_data=button.callback_data)
+                    for button in row
+                ])
+
+        try:
+            messages = wait_result(self.bot.send_media_group(chat_id, media))
+        except Exception as e:
+            print(f"Ошибка отправки альбома рецептов: {e}")
+            # При флуд-лимите не дублируем альбом поштучной отправкой
+            return get_retry_after(e) is not None
+
+        for (_, image_url, _), message in zip(cards, messages or []):
+            self._remember_file_id(image_url, message)
+
+        self.bot.send_message(chat_id, "👆 Выберите действие для рецепта:", reply_markup=combined_markup)
+        return True
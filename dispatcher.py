@@ -0,0 +1,135 @@
+import threading
+from collections import deque
+from config import UPDATE_WORKERS, UPDATE_MAX_PENDING, UPDATE_MAX_PENDING_PER_CHAT
+from outbound import ThrottledTeleBot
+
+
+def update_chat_key(update):
+    """Ключ очереди для обновления: id чата или пользователя
+
+    Обновления без чата (например, служебные) получают собственный ключ
+    и обрабатываются без ограничений порядка.
+    """
+    message = (update.message or update.edited_message
+               or update.channel_post or update.edited_channel_post)
+    if message is not None:
+        return message.chat.id
+
+    callback = update.callback_query
+    if callback is not None:
+        if callback.message is not None:
+            return callback.message.chat.id
+        return callback.from_user.id
+
+    for field in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query'):
+        event = getattr(update, field, None)
+        if event is not None:
+            return event.from_user.id
+
+    return ('update', update.update_id)
+
+
+class ChatDispatcher:
+    """Обработка обновлений пулом потоков с сохранением порядка в чате
+
+    Обновления разных чатов обрабатываются параллельно, обновления одного
+    чата - строго по очереди, поэтому обработчики одного чата не гоняются
+    за общее состояние (например, user_states). Число ожидающих обновлений
+    ограничено: submit ждет освобождения места или сразу возвращает False.
+    """
+
+    def __init__(self, handler, workers=UPDATE_WORKERS, max_pending=UPDATE_MAX_PENDING,
+                 max_pending_per_chat=UPDATE_MAX_PENDING_PER_CHAT):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.max_pending_per_chat = max_pending_per_chat
+        self._chats = {}  # Ключ чата -> очередь обновлений; первое сейчас в работе
+        self._ready = deque()  # Чаты, у которых есть обновление и нет работающего
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f'dispatcher-{number}', daemon=True)
+            for number in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, update, block=True, timeout=None):
+        """Ставит обновление в очередь своего чата
+
+        Возвращает False, если очередь переполнена (при block=False или по
+        истечении timeout). Если один чат прислал слишком много еще не
+        обработанных обновлений, новые отбрасываются, чтобы он не занял
+        всю очередь; повторно их доставлять не нужно.
+        """
+        key = update_chat_key(update)
+        with self._lock:
+            queue = self._chats.get(key)
+            if queue is not None and len(queue) >= self.max_pending_per_chat:
+                print(f"⚠️ Слишком много необработанных обновлений из чата {key}, обновление пропущено")
+                return True
+
+            while self._pending >= self.max_pending:
+                if not block or not self._not_full.wait(timeout):
+                    return False
+            queue = self._chats.get(key)  # Могла измениться, пока ждали
+
+            if queue is None:
+                self._chats[key] = deque([update])
+                self._ready.append(key)
+                self._not_empty.notify()
+            else:
+                queue.append(update)
+            self._pending += 1
+            return True
+
+    def depth(self):
+        """Количество обновлений в очереди и в обработке"""
+        with self._lock:
+            return self._pending
+
+    def _worker_loop(self):
+        while True:
+            with self._lock:
+                while not self._ready:
+                    self._not_empty.wait()
+                key = self._ready.popleft()
+                update = self._chats[key][0]
+
+            try:
+                self.handler(update)
+            except Exception as e:
+                print(f"❌ Ошибка обработки обновления {update.update_id}: {e}")
+
+            with self._lock:
+                queue = self._chats[key]
+                queue.popleft()
+                if queue:
+                    self._ready.append(key)
+                    self._not_empty.notify()
+                else:
+                    del self._chats[key]
+                self._pending -= 1
+                self._not_full.notify()
+
+
+class DispatchingTeleBot(ThrottledTeleBot):
+    """TeleBot, который обрабатывает обновления через ChatDispatcher
+
+    Подходит и для polling, и для webhook: process_new_updates только ставит
+    обновления в очередь, а обработчики выполняются потоками диспетчера.
+    """
+
+    def __init__(self, token, dispatcher=None, **kwargs):
+        kwargs['threaded'] = False  # Потоками управляет диспетчер
+        super().__init__(token, **kwargs)
+        self.dispatcher = dispatcher if dispatcher is not None else ChatDispatcher(self._process_update)
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            self.dispatcher.submit(update)
+
+    def _process_update(self, update):
+        super().process_new_updates([update])
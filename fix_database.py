@@ -5,7 +5,8 @@
 
 import sqlite3
 import os
-from config import DATABASE_NAME
+from config import DATABASE_NAME, RECIPE_CODEC
+from recipe_codec import encode_recipe, decode_recipe
 
 def check_and_fix_database():
     """Проверяет и исправляет структуру базы данных"""
@@ -72,6 +73,84 @@ def check_and_fix_database():
             
     except sqlite3.Error as e:
         print(f"❌ Ошибка проверки базы данных: {e}")
+        return
+    
+    migrate_recipe_data()
+    compress_recipe_data()
+
+def migrate_recipe_data():
+    """Переносит данные рецептов из favorites в общую таблицу recipes
+    
+    После миграции в favorites остаются только ссылки на рецепты, и одна
+    копия данных хранится на каждый рецепт, а не на каждого пользователя.
+    """
+    try:
+        with sqlite3.connect(DATABASE_NAME) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recipes (
+                    recipe_id TEXT PRIMARY KEY,
+                    recipe_data TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute("SELECT COUNT(*) FROM favorites WHERE recipe_data != ''")
+            pending_count = cursor.fetchone()[0]
+            if pending_count == 0:
+                print("✅ Данные рецептов уже перенесены в общую таблицу")
+                return
+            
+            print(f"🔄 Перенос данных рецептов: {pending_count} записей избранного...")
+            
+            # Для каждого рецепта берем самую свежую сохраненную копию
+            cursor.execute('''
+                INSERT OR IGNORE INTO recipes (recipe_id, recipe_data)
+                SELECT recipe_id, recipe_data FROM favorites 
+                WHERE recipe_data != ''
+                ORDER BY saved_at DESC
+            ''')
+            print(f"📦 Добавлено уникальных рецептов: {cursor.rowcount}")
+            
+            cursor.execute("UPDATE favorites SET recipe_data = '' WHERE recipe_data != ''")
+            conn.commit()
+            
+            # Освобождаем место, которое занимали дублирующиеся копии
+            conn.execute("VACUUM")
+            print("🔧 Миграция данных рецептов завершена!")
+            
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка миграции данных рецептов: {e}")
+
+def compress_recipe_data():
+    """Перекодирует рецепты, сохраненные обычным JSON, в текущий формат хранения"""
+    if RECIPE_CODEC == 'json':
+        return
+    
+    try:
+        with sqlite3.connect(DATABASE_NAME) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT recipe_id, recipe_data FROM recipes WHERE typeof(recipe_data) = 'text'")
+            updates = []
+            for recipe_id, recipe_data in cursor.fetchall():
+                try:
+                    updates.append((encode_recipe(decode_recipe(recipe_data)), recipe_id))
+                except ValueError:
+                    print(f"⚠️ Пропущен рецепт с поврежденными данными: {recipe_id}")
+            
+            if not updates:
+                print("✅ Все рецепты уже хранятся в сжатом виде")
+                return
+            
+            cursor.executemany("UPDATE recipes SET recipe_data = ? WHERE recipe_id = ?", updates)
+            conn.commit()
+            conn.execute("VACUUM")
+            print(f"🗜️ Сжато рецептов: {len(updates)} (формат {RECIPE_CODEC})")
+            
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка сжатия данных рецептов: {e}")
 
 if __name__ == "__main__":
     print("🔧 Проверка и исправление базы данных рецептов...")
@@ -0,0 +1,233 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Границы корзин гистограмм по умолчанию (в секундах)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Набор метрик, которые отдаются в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Текст для эндпоинта /metrics"""
+        with self._lock:
+            metrics = list(self._metrics)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                print(f"❌ Ошибка сбора метрики {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Распределение длительностей по корзинам"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока with"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        with self._lock:
+            values = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class CallbackMetric(_Metric):
+    """Метрика, значение которой вычисляется при каждом сборе
+
+    func возвращает число или словарь {кортеж значений меток: число}.
+    """
+
+    def __init__(self, name, help, metric_type='gauge', labelnames=(), func=None, registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.type = metric_type
+        self.func = func
+
+    def set_function(self, func):
+        self.func = func
+
+    def collect(self):
+        if self.func is None:
+            return
+        value = self.func()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for key, sample in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(sample)}"
+
+
+def timed_method(histogram):
+    """Декоратор: время выполнения метода с меткой method=имя метода"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(method=func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Метрики бота
+UPDATE_SECONDS = Histogram(
+    'bot_update_duration_seconds', "Время обработки обновления по маршрутам", ('kind', 'route')
+)
+UPSTREAM_SECONDS = Histogram(
+    'themealdb_request_duration_seconds', "Время запросов к TheMealDB", ('endpoint',)
+)
+UPSTREAM_ERRORS = Counter(
+    'themealdb_request_errors_total', "Ошибки запросов к TheMealDB", ('endpoint',)
+)
+DB_SECONDS = Histogram(
+    'db_query_duration_seconds', "Время методов RecipeDatabase", ('method',)
+)
+RENDER_CACHE_LOOKUPS = Counter(
+    'render_cache_lookups_total', "Обращения к кэшу отрисованных рецептов", ('result',)
+)
+API_CACHE_LOOKUPS = CallbackMetric(
+    'api_cache_lookups_total', "Обращения к кэшу ответов TheMealDB", 'counter', ('result',)
+)
+API_CACHE_HIT_RATIO = CallbackMetric(
+    'api_cache_hit_ratio', "Доля попаданий в кэш ответов TheMealDB"
+)
+OUTBOUND_QUEUE_DEPTH = CallbackMetric(
+    'outbound_queue_depth', "Сообщений в очереди отправки в Telegram"
+)
+UPDATE_QUEUE_DEPTH = CallbackMetric(
+    'update_queue_depth', "Обновлений в очереди и в обработке"
+)
+PREFETCH_QUEUE_DEPTH = CallbackMetric(
+    'prefetch_queue_depth', "Рецептов в очереди предзагрузки деталей"
+)
+
+
+def timed_handler(kind, route=None):
+    """Декоратор обработчика обновлений: время по маршруту
+
+    route(update) возвращает имя маршрута; по умолчанию это имя функции.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(update, *args, **kwargs):
+            name = route(update) if route is not None else func.__name__
+            with UPDATE_SECONDS.time(kind=kind, route=name):
+                return func(update, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_cache_stats(cache):
+    """Отдает статистику TieredCache через метрики кэша ответов TheMealDB"""
+    def lookups():
+        stats = cache.stats()
+        return {
+            ('memory_hit',): stats['memory_hits'],
+            ('disk_hit',): stats['disk_hits'],
+            ('miss',): stats['misses'],
+        }
+
+    def hit_ratio():
+        stats = cache.stats()
+        hits = stats['memory_hits'] + stats['disk_hits']
+        total = hits + stats['misses']
+        return hits / total if total else 0.0
+
+    API_CACHE_LOOKUPS.set_function(lookups)
+    API_CACHE_HIT_RATIO.set_function(hit_ratio)
@@ -0,0 +1,142 @@
+from collections.abc import Mapping
+
+# TheMealDB возвращает до 20 пар ингредиент/мера в отдельных полях
+MAX_INGREDIENTS = 20
+
+# Поле ответа TheMealDB -> атрибут Meal
+MEAL_FIELDS = {
+    'idMeal': 'id',
+    'strMeal': 'name',
+    'strCategory': 'category',
+    'strArea': 'area',
+    'strInstructions': 'instructions',
+    'strMealThumb': 'thumb',
+    'strTags': 'tags',
+    'strYoutube': 'youtube',
+    'strSource': 'source',
+}
+INGREDIENT_KEYS = tuple(
+    (f'strIngredient{i}', f'strMeasure{i}') for i in range(1, MAX_INGREDIENTS + 1)
+)
+
+
+def _clean(value):
+    """Пустые строки и строки из пробелов из API превращаются в None"""
+    if isinstance(value, str) and not value.strip():
+        return None
+    return value
+
+
+class Meal(Mapping):
+    """Рецепт TheMealDB в компактном виде
+
+    Создается один раз на границе с API или базой данных: пустые поля
+    отбрасываются, а 40 полей strIngredientN/strMeasureN сворачиваются в
+    кортеж пар (ингредиент, мера). Код бота обращается к атрибутам;
+    для совместимости рецепт также читается как словарь с ключами TheMealDB
+    (meal['idMeal'], meal.get('strMeal')), пустые поля в нем отсутствуют.
+    """
+
+    __slots__ = ('id', 'name', 'category', 'area', 'instructions', 'thumb',
+                 'tags', 'youtube', 'source', 'ingredients')
+
+    def __init__(self, id, name=None, category=None, area=None, instructions=None, thumb=None,
+                 tags=None, youtube=None, source=None, ingredients=()):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.area = area
+        self.instructions = instructions
+        self.thumb = thumb
+        self.tags = tags
+        self.youtube = youtube
+        self.source = source
+        self.ingredients = ingredients
+
+    @classmethod
+    def from_api(cls, data):
+        """Рецепт из словаря в формате TheMealDB (полного или краткого)"""
+        ingredients = []
+        for ingredient_key, measure_key in INGREDIENT_KEYS:
+            ingredient = _clean(data.get(ingredient_key))
+            if ingredient:
+                measure = _clean(data.get(measure_key))
+                ingredients.append((ingredient.strip(), measure.strip() if measure else ''))
+
+        meal_id = data.get('idMeal')
+        return cls(
+            str(meal_id) if meal_id is not None else None,
+            ingredients=tuple(ingredients),
+            **{attr: _clean(data.get(key)) for key, attr in MEAL_FIELDS.items() if attr != 'id'}
+        )
+
+    @classmethod
+    def coerce(cls, value):
+        """Meal из Meal, словаря TheMealDB или ленивых данных из базы"""
+        if isinstance(value, Meal):
+            return value
+        to_meal = getattr(value, 'to_meal', None)
+        if to_meal is not None:
+            return to_meal()
+        return cls.from_api(value)
+
+    @classmethod
+    def from_api_list(cls, meals):
+        """Список рецептов из поля meals ответа TheMealDB (там бывает null)"""
+        return [cls.from_api(meal) for meal in meals or []]
+
+    def to_dict(self):
+        """Компактный словарь в формате TheMealDB (без пустых полей)"""
+        return dict(self.items())
+
+    def fingerprint(self):
+        """Отпечаток содержимого рецепта для проверки изменений"""
+        return hash(self._values())
+
+    def _values(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __getitem__(self, key):
+        attr = MEAL_FIELDS.get(key)
+        if attr is not None:
+            value = getattr(self, attr)
+        elif key.startswith('strIngredient') or key.startswith('strMeasure'):
+            value = self._ingredient_field(key)
+        else:
+            value = None
+
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def _ingredient_field(self, key):
+        is_measure = key.startswith('strMeasure')
+        number = key[len('strMeasure' if is_measure else 'strIngredient'):]
+        if not number.isdigit() or not 1 <= int(number) <= len(self.ingredients):
+            return None
+        return self.ingredients[int(number) - 1][is_measure] or None
+
+    def __iter__(self):
+        for key, attr in MEAL_FIELDS.items():
+            if getattr(self, attr) is not None:
+                yield key
+        for (ingredient_key, measure_key), (_, measure) in zip(INGREDIENT_KEYS, self.ingredients):
+            yield ingredient_key
+            if measure:
+                yield measure_key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, Meal):
+            return self._values() == other._values()
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f"Meal(id={self.id!r}, name={self.name!r})"
@@ -0,0 +1,316 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import telebot
+from config import (
+    OUTBOUND_PER_CHAT_RATE, OUTBOUND_PER_CHAT_BURST, OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_GLOBAL_BURST, OUTBOUND_WORKERS, OUTBOUND_MAX_RETRIES
+)
+
+# Приоритеты исходящих сообщений: меньше - важнее
+PRIORITY_INTERACTIVE = 0  # Ответы на действия пользователя
+PRIORITY_BULK = 1  # Массовая отправка (карточки рецептов)
+
+
+def wait_result(value):
+    """Результат запроса: ждет Future из ThrottledTeleBot, остальное возвращает как есть"""
+    return value.result() if isinstance(value, Future) else value
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"❌ Ошибка запроса к Telegram: {future.exception()}")
+
+
+def _edit_key(args, kwargs):
+    """Ключ очереди для edit_message_*: чат или inline-сообщение"""
+    chat_id = kwargs.get('chat_id', args[0] if args else None)
+    if chat_id is not None:
+        return chat_id
+    return ('inline', kwargs.get('inline_message_id', args[2] if len(args) > 2 else None))
+
+
+def get_retry_after(error):
+    """Секунды ожидания из ошибки 429 Telegram или None для других ошибок"""
+    if getattr(error, 'error_code', None) != 429:
+        return None
+    result_json = getattr(error, 'result_json', None) or {}
+    return result_json.get('parameters', {}).get('retry_after', 1)
+
+
+def is_chat_limit(chat_id):
+    """429 относится к самому чату, а не ко всему боту
+
+    Отдельный лимит Telegram есть только у групп и каналов (их id
+    отрицательные); личные чаты ограничены своей корзиной, поэтому 429
+    в них означает общий лимит бота.
+    """
+    return isinstance(chat_id, int) and chat_id < 0
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity сразу"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, now):
+        """Через сколько секунд будет доступен токен"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        """Блокирует корзину (например, по retry_after от Telegram)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, now):
+        """Корзина полна и не заблокирована - ее можно не хранить"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class _Job:
+    __slots__ = ('func', 'args', 'kwargs', 'priority', 'seq', 'future', 'attempts')
+
+    def __init__(self, func, args, kwargs, priority, seq):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.future = Future()
+        self.attempts = 0
+
+
+class OutboundQueue:
+    """Общая очередь исходящих запросов к Telegram с ограничением скорости
+
+    Соблюдает лимиты на чат и на бота в целом (корзины токенов), повторяет
+    запросы после 429 через retry_after и отдает предпочтение интерактивным
+    ответам перед массовой отправкой. Сообщения одного чата уходят строго
+    по порядку, по одному за раз; разные чаты отправляются параллельно.
+    Запросы из submit_unthrottled (ответы на нажатия) не ждут лимитов и
+    выполняются в отдельных потоках.
+    """
+
+    BUCKET_SWEEP_INTERVAL = 60
+
+    def __init__(self, per_chat_rate=OUTBOUND_PER_CHAT_RATE, per_chat_burst=OUTBOUND_PER_CHAT_BURST,
+                 global_rate=OUTBOUND_GLOBAL_RATE, global_burst=OUTBOUND_GLOBAL_BURST,
+                 workers=OUTBOUND_WORKERS):
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets = {}
+        self._chats = {}  # chat_id -> очередь заданий
+        self._busy = set()  # Чаты, у которых задание уже отправляется
+        self._ready = []  # Куча (приоритет, номер, chat_id) - можно отправлять
+        self._delayed = []  # Куча (время, номер, chat_id) - ждут свою корзину
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._last_sweep = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbound')
+        self._unthrottled = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbound-direct')
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='outbound-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    @contextmanager
+    def bulk(self):
+        """Все сообщения внутри блока отправляются с низким приоритетом"""
+        previous = getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+        self._local.priority = PRIORITY_BULK
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def depth(self):
+        """Количество заданий, ожидающих отправки"""
+        with self._cond:
+            return sum(len(jobs) for jobs in self._chats.values())
+
+    def wait_idle(self, timeout=None):
+        """Ждет, пока все задания будут отправлены; False по таймауту"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._chats and not self._busy, timeout)
+
+    def call(self, chat_id, func, /, *args, **kwargs):
+        """Ставит запрос в очередь и ждет его результата"""
+        return self.submit(chat_id, func, *args, **kwargs).result()
+
+    def submit(self, chat_id, func, /, *args, **kwargs):
+        """Ставит запрос в очередь и возвращает Future с его результатом"""
+        priority = getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+        with self._cond:
+            job = _Job(func, args, kwargs, priority, next(self._seq))
+            jobs = self._chats.setdefault(chat_id, deque())
+            jobs.append(job)
+            if len(jobs) == 1 and chat_id not in self._busy:
+                self._schedule(chat_id, time.monotonic())
+            self._cond.notify_all()
+        return job.future
+
+    def submit_unthrottled(self, func, /, *args, **kwargs):
+        """Выполняет запрос сразу, вне очереди и лимитов; возвращает Future"""
+        return self._unthrottled.submit(func, *args, **kwargs)
+
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    def _schedule(self, chat_id, now):
+        """Ставит чат с ожидающим заданием в нужную кучу (под блокировкой)"""
+        head = self._chats[chat_id][0]
+        delay = self._bucket(chat_id).delay(now)
+        if delay <= 0:
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        else:
+            heapq.heappush(self._delayed, (now + delay, head.seq, chat_id))
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._delayed and self._delayed[0][0] <= now:
+                        _, _, chat_id = heapq.heappop(self._delayed)
+                        self._schedule(chat_id, now)
+
+                    if self._ready:
+                        timeout = self._global.delay(now)
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = self._delayed[0][0] - now if self._delayed else None
+                    self._cond.wait(timeout)
+
+                _, _, chat_id = heapq.heappop(self._ready)
+                job = self._chats[chat_id].popleft()
+                self._global.consume(now)
+                self._bucket(chat_id).consume(now)
+                self._busy.add(chat_id)
+
+                if now - self._last_sweep > self.BUCKET_SWEEP_INTERVAL:
+                    self._sweep_buckets(now)
+
+            self._executor.submit(self._execute, chat_id, job)
+
+    def _execute(self, chat_id, job):
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after is not None and job.attempts < OUTBOUND_MAX_RETRIES:
+                job.attempts += 1
+                print(f"⏳ Лимит Telegram для чата {chat_id}, повтор через {retry_after} с")
+                with self._cond:
+                    self._bucket(chat_id).pause(retry_after)
+                    if not is_chat_limit(chat_id):
+                        # Общий лимит бота: останавливаем отправку во все чаты
+                        self._global.pause(retry_after)
+                    self._chats[chat_id].appendleft(job)
+                    self._finish(chat_id)
+                return
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+
+        with self._cond:
+            self._finish(chat_id)
+
+    def _finish(self, chat_id):
+        """Освобождает чат после отправки задания (под блокировкой)"""
+        self._busy.discard(chat_id)
+        if self._chats.get(chat_id):
+            self._schedule(chat_id, time.monotonic())
+        else:
+            self._chats.pop(chat_id, None)
+        self._cond.notify_all()
+
+    def _sweep_buckets(self, now):
+        """Удаляет корзины неактивных чатов, чтобы память не росла"""
+        self._buckets = {
+            chat_id: bucket for chat_id, bucket in self._buckets.items()
+            if chat_id in self._chats or chat_id in self._busy or not bucket.is_idle(now)
+        }
+        self._last_sweep = now
+
+
+class ThrottledTeleBot(telebot.TeleBot):
+    """TeleBot, который отправляет запросы через OutboundQueue
+
+    Методы отправки, редактирования и ответа на нажатия не ждут своей
+    очереди: они возвращают Future, и обработчик сразу освобождается.
+    Код, которому нужно отправленное сообщение или ошибка, берет их через
+    .result() (или wait_result). Ошибки запросов пишутся в лог.
+    """
+
+    def __init__(self, token, outbound=None, **kwargs):
+        super().__init__(token, **kwargs)
+        self.outbound = outbound if outbound is not None else OutboundQueue()
+
+    @property
+    def direct(self):
+        """Методы TeleBot в обход очереди - для заданий, уже выполняющихся в ней"""
+        return super()
+
+    def submit(self, chat_id, func, /, *args, **kwargs):
+        """Выполняет func(direct, *args, **kwargs) одним заданием в очереди чата
+
+        Для составных отправок: например, фото с запасной отправкой текстом.
+        """
+        return self._enqueue(chat_id, func, self.direct, *args, **kwargs)
+
+    def _enqueue(self, key, func, /, *args, **kwargs):
+        future = self.outbound.submit(key, func, *args, **kwargs)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def send_message(self, chat_id, *args, **kwargs):
+        return self._enqueue(chat_id, super().send_message, chat_id, *args, **kwargs)
+
+    def send_photo(self, chat_id, *args, **kwargs):
+        return self._enqueue(chat_id, super().send_photo, chat_id, *args, **kwargs)
+
+    def send_media_group(self, chat_id, *args, **kwargs):
+        return self._enqueue(chat_id, super().send_media_group, chat_id, *args, **kwargs)
+
+    def edit_message_text(self, text, *args, **kwargs):
+        return self._enqueue(_edit_key(args, kwargs), super().edit_message_text, text, *args, **kwargs)
+
+    def edit_message_caption(self, caption, *args, **kwargs):
+        return self._enqueue(_edit_key(args, kwargs), super().edit_message_caption, caption, *args, **kwargs)
+
+    def edit_message_media(self, media, *args, **kwargs):
+        return self._enqueue(_edit_key(args, kwargs), super().edit_message_media, media, *args, **kwargs)
+
+    def edit_message_reply_markup(self, *args, **kwargs):
+        return self._enqueue(_edit_key(args, kwargs), super().edit_message_reply_markup, *args, **kwargs)
+
+    def answer_callback_query(self, callback_query_id, *args, **kwargs):
+        # Ответ не отправляет сообщений и не должен ждать массовую отправку карточек
+        future = self.outbound.submit_unthrottled(
+            super().answer_callback_query, callback_query_id, *args, **kwargs
+        )
+        future.add_done_callback(_log_failure)
+        return future
@@ -0,0 +1,76 @@
+import heapq
+import itertools
+import threading
+from config import PREFETCH_WORKERS, PREFETCH_MAX_PENDING, PREFETCH_PER_CHAT
+
+
+class PrefetchScheduler:
+    """Фоновый прогрев кэша деталей рецептов
+
+    После показа карточек следующее нажатие чаще всего "Подробнее" или
+    "Сохранить" для одной из них, поэтому детали показанных рецептов
+    запрашиваются заранее. Очередь упорядочена по позиции карточки:
+    первые карточки всех чатов прогреваются раньше последних. Каждый чат
+    занимает в очереди не больше per_chat рецептов, а вся очередь -
+    не больше max_pending; лишнее просто не предзагружается.
+    """
+
+    def __init__(self, fetch, workers=PREFETCH_WORKERS, max_pending=PREFETCH_MAX_PENDING,
+                 per_chat=PREFETCH_PER_CHAT):
+        self.fetch = fetch
+        self.max_pending = max_pending
+        self.per_chat = per_chat
+        self._heap = []  # (приоритет, порядковый номер, chat_id, meal_id)
+        self._seq = itertools.count()
+        self._scheduled = set()  # id в очереди и в работе
+        self._per_chat = {}  # chat_id -> рецептов в очереди и в работе
+        self._cond = threading.Condition()
+
+        for number in range(workers):
+            threading.Thread(target=self._worker_loop, name=f"prefetch-{number}", daemon=True).start()
+
+    def schedule(self, chat_id, meal_ids, priority=0):
+        """Ставит в очередь детали рецептов в порядке показа; возвращает число добавленных"""
+        added = 0
+        with self._cond:
+            budget = self.per_chat - self._per_chat.get(chat_id, 0)
+            for position, meal_id in enumerate(meal_ids):
+                if budget <= 0 or len(self._heap) >= self.max_pending:
+                    break
+                if meal_id is None or meal_id in self._scheduled:
+                    continue
+
+                heapq.heappush(self._heap, (priority + position, next(self._seq), chat_id, meal_id))
+                self._scheduled.add(meal_id)
+                budget -= 1
+                added += 1
+
+            if added:
+                self._per_chat[chat_id] = self._per_chat.get(chat_id, 0) + added
+                self._cond.notify(added)
+        return added
+
+    def depth(self):
+        """Рецептов в очереди и в работе"""
+        with self._cond:
+            return len(self._scheduled)
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, chat_id, meal_id = heapq.heappop(self._heap)
+
+            try:
+                self.fetch(meal_id)
+            except Exception as e:
+                print(f"❌ Ошибка предзагрузки рецепта {meal_id}: {e}")
+            finally:
+                with self._cond:
+                    self._scheduled.discard(meal_id)
+                    remaining = self._per_chat[chat_id] - 1
+                    if remaining:
+                        self._per_chat[chat_id] = remaining
+                    else:
+                        del self._per_chat[chat_id]
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from config import (
+    RANDOM_POOL_SIZE, RANDOM_POOL_LOW_WATER, RANDOM_POOL_SEEN_PER_CHAT,
+    RANDOM_POOL_SEEN_TTL, RANDOM_POOL_RETRY_DELAY, RANDOM_POOL_FALLBACK_ATTEMPTS,
+)
+from state_store import MemoryStateStore
+
+
+class RandomMealPool:
+    """Запас случайных рецептов, заранее полученных из TheMealDB
+
+    Фоновый поток держит в запасе до size рецептов без повторов и
+    пополняет его, когда рецептов становится меньше low_water. Нажатие
+    "Случайный рецепт" обслуживается из памяти; рецепты, которые чат уже
+    видел недавно, ему не выдаются. Если подходящего рецепта в запасе нет,
+    рецепт запрашивается у API сразу (несколько попыток, уже виденные
+    рецепты откладываются в запас для других чатов).
+    """
+
+    def __init__(self, client, size=RANDOM_POOL_SIZE, low_water=RANDOM_POOL_LOW_WATER,
+                 seen_per_chat=RANDOM_POOL_SEEN_PER_CHAT, retry_delay=RANDOM_POOL_RETRY_DELAY):
+        self.client = client
+        self.size = size
+        self.low_water = low_water
+        self.seen_per_chat = seen_per_chat
+        self.retry_delay = retry_delay
+        self._meals = OrderedDict()  # id -> Meal, в порядке получения
+        self._seen = MemoryStateStore(RANDOM_POOL_SEEN_TTL)  # chat_id -> deque последних id
+        self._lock = threading.Lock()
+        self._refill = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает фоновое пополнение запаса"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refill_loop, daemon=True)
+            self._thread.start()
+            self._refill.set()
+        return self
+
+    def __len__(self):
+        return len(self._meals)
+
+    def get(self, chat_id):
+        """Случайный рецепт для чата: из запаса или, если там пусто, из API"""
+        seen = self._seen.get(chat_id)
+        meal = None
+        with self._lock:
+            for meal_id in self._meals:
+                if seen is None or meal_id not in seen:
+                    meal = self._meals.pop(meal_id)
+                    break
+            if len(self._meals) < self.low_water:
+                self._refill.set()
+
+        if meal is None:
+            meal = self._fetch_unseen(seen)
+        if meal is not None:
+            self._mark_seen(chat_id, meal.id)
+        return meal
+
+    def _fetch_unseen(self, seen):
+        """Рецепт из API, которого нет среди seen; последний полученный, если такого нет"""
+        meal = None
+        for _ in range(RANDOM_POOL_FALLBACK_ATTEMPTS):
+            meal = self.client.get_random_meal()
+            if meal is None or seen is None or meal.id not in seen:
+                return meal
+            with self._lock:
+                if len(self._meals) < self.size:
+                    self._meals.setdefault(meal.id, meal)
+        return meal
+
+    def _mark_seen(self, chat_id, meal_id):
+        seen = self._seen.get(chat_id)
+        if seen is None:
+            seen = deque(maxlen=self.seen_per_chat)
+        seen.append(meal_id)
+        self._seen.set(chat_id, seen)
+
+    def _refill_loop(self):
+        while True:
+            self._refill.wait()
+            self._refill.clear()
+            if not self.fill():
+                time.sleep(self.retry_delay)
+                self._refill.set()
+
+    def fill(self):
+        """Пополняет запас до size; False, если API не ответил"""
+        # random.php часто повторяет рецепты: ограничиваем число попыток
+        attempts = self.size * 3
+        while attempts > 0:
+            with self._lock:
+                if len(self._meals) >= self.size:
+                    break
+            attempts -= 1
+            meal = self.client.get_random_meal()
+            if meal is None:
+                return False
+            with self._lock:
+                if meal.id not in self._meals and len(self._meals) < self.size:
+                    self._meals[meal.id] = meal
+        return True
@@ -0,0 +1,117 @@
+import json
+import zlib
+from config import RECIPE_CODEC
+
+# Предустановленный словарь для zlib: ключи и частые значения TheMealDB.
+# Самые частые фрагменты стоят в конце - zlib кодирует их короче.
+# Словарь нельзя менять: сохраненные им данные не раскодируются. Для нового
+# словаря нужно добавить новый кодек со своим тегом.
+RECIPE_ZDICT_V1 = (
+    '"strTags":"strCreativeCommonsConfirmed":"dateModified":"strSource":"http'
+    '"strDrinkAlternate":"strImageSource":"strYoutube":"https://www.youtube.com/watch?v='
+    '"strArea":"British","American","Italian","French","Indian","Chinese","Mexican",'
+    '"strCategory":"Beef","Chicken","Dessert","Seafood","Vegetarian","Pasta","Side",'
+    '"strInstructions":". Add the ","Preheat the oven to ","minutes","Serve with ",'
+    '"strMealThumb":"https://www.themealdb.com/images/media/meals/.jpg",'
+    '"strMeasure20":"strMeasure19":"strMeasure18":"strMeasure17":"strMeasure16":'
+    '"strIngredient20":"strIngredient19":"strIngredient18":"strIngredient17":'
+    '"strIngredient16":"strMeasure15":"strMeasure14":"strMeasure13":"strMeasure12":'
+    '"strIngredient15":"strIngredient14":"strIngredient13":"strIngredient12":'
+    '"strMeasure11":"strMeasure10":"strIngredient11":"strIngredient10":'
+    '"Salt","Pepper","Onion","Garlic","Olive Oil","Butter","Sugar","Eggs","Flour",'
+    '"1 tsp ","2 tbs","1 tbs","pinch","to taste","chopped","sliced","g","ml",'
+    '"strMeasure9":"strMeasure8":"strMeasure7":"strMeasure6":"strMeasure5":'
+    '"strIngredient9":"strIngredient8":"strIngredient7":"strIngredient6":'
+    '"strIngredient5":"strMeasure4":"strMeasure3":"strMeasure2":"strMeasure1":'
+    '"strIngredient4":"strIngredient3":"strIngredient2":"strIngredient1":'
+    '{"idMeal":"5","strMeal":"'
+).encode('utf-8')
+
+
+def compact_recipe(recipe):
+    """Убирает пустые поля рецепта (null, пустые строки и пробелы)"""
+    return {
+        key: value for key, value in recipe.items()
+        if value is not None and not (isinstance(value, str) and not value.strip())
+    }
+
+
+class JsonCodec:
+    """Обычный JSON без сжатия (формат до появления кодеков)"""
+
+    name = 'json'
+
+    def encode(self, recipe):
+        return json.dumps(recipe, ensure_ascii=False)
+
+    def decode(self, payload):
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        return json.loads(payload)
+
+
+class ZlibCodec:
+    """Компактный JSON без пустых полей, сжатый zlib
+
+    Данные начинаются с байта-тега кодека, поэтому при чтении формат
+    определяется автоматически.
+    """
+
+    name = 'zlib'
+    tag = 1
+    zdict = None
+
+    def _compressor(self):
+        if self.zdict:
+            return zlib.compressobj(9, zdict=self.zdict)
+        return zlib.compressobj(9)
+
+    def _decompressor(self):
+        if self.zdict:
+            return zlib.decompressobj(zdict=self.zdict)
+        return zlib.decompressobj()
+
+    def encode(self, recipe):
+        raw = json.dumps(compact_recipe(recipe), ensure_ascii=False, separators=(',', ':'))
+        compressor = self._compressor()
+        return bytes([self.tag]) + compressor.compress(raw.encode('utf-8')) + compressor.flush()
+
+    def decode(self, payload):
+        try:
+            decompressor = self._decompressor()
+            raw = decompressor.decompress(payload[1:]) + decompressor.flush()
+        except zlib.error as e:
+            raise ValueError(f"Повреждены сжатые данные рецепта: {e}") from e
+        return json.loads(raw.decode('utf-8'))
+
+
+class DictZlibCodec(ZlibCodec):
+    """Как ZlibCodec, но с предустановленным словарем частых фрагментов"""
+
+    name = 'zlib_dict'
+    tag = 2
+    zdict = RECIPE_ZDICT_V1
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), ZlibCodec(), DictZlibCodec())}
+CODECS_BY_TAG = {codec.tag: codec for codec in CODECS.values() if hasattr(codec, 'tag')}
+
+
+def encode_recipe(recipe, codec_name=RECIPE_CODEC):
+    """Кодирует рецепт для хранения в базе данных"""
+    return CODECS[codec_name].encode(recipe)
+
+
+def decode_recipe(payload):
+    """Декодирует рецепт из базы в любом поддерживаемом формате
+
+    Текст считается обычным JSON, байты - данными кодека с тегом в первом
+    байте. При поврежденных данных выбрасывается ValueError.
+    """
+    if isinstance(payload, str):
+        return json.loads(payload)
+
+    codec = CODECS_BY_TAG.get(payload[0]) if payload else None
+    if codec is None:
+        raise ValueError("Неизвестный формат данных рецепта")
+    return codec.decode(payload)
@@ -0,0 +1,196 @@
+from config import FUZZY_MAX_DISTANCE
+
+
+def normalize_term(value):
+    """Приводит ингредиент или категорию к виду для сравнения"""
+    return (value or '').replace('_', ' ').strip().lower()
+
+
+class IngredientIndex:
+    """Инвертированный индекс: ингредиент -> множество ID рецептов"""
+
+    def __init__(self):
+        self._postings = {}
+        self._sizes = {}  # Количество ингредиентов в каждом рецепте
+
+    @classmethod
+    def build(cls, meals):
+        """Строит индекс по списку рецептов"""
+        index = cls()
+        for meal in meals:
+            index.add(meal)
+        return index
+
+    def add(self, meal):
+        """Добавляет рецепт (Meal) в индекс"""
+        meal_id = meal.id
+        names = {normalize_term(ingredient) for ingredient, _ in meal.ingredients}
+
+        for name in names:
+            self._postings.setdefault(name, set()).add(meal_id)
+        self._sizes[meal_id] = len(names)
+
+    def lookup(self, ingredient):
+        """ID рецептов, содержащих ингредиент"""
+        return self._postings.get(normalize_term(ingredient), set())
+
+    def search(self, ingredients, match_all=True):
+        """Ищет рецепты по нескольким ингредиентам
+
+        При match_all=True рецепт должен содержать все ингредиенты (AND),
+        иначе хотя бы один (OR). Результат - список пар (ID рецепта, покрытие),
+        где покрытие - доля ингредиентов рецепта, которые есть у пользователя.
+        Рецепты упорядочены по числу совпадений и покрытию.
+        """
+        terms = {normalize_term(ingredient) for ingredient in ingredients}
+        terms.discard('')
+        if not terms:
+            return []
+
+        postings = sorted((self._postings.get(term, set()) for term in terms), key=len)
+        if match_all:
+            matched = set.intersection(*postings) if postings[0] else set()
+            counts = dict.fromkeys(matched, len(terms))
+        else:
+            counts = {}
+            for meal_ids in postings:
+                for meal_id in meal_ids:
+                    counts[meal_id] = counts.get(meal_id, 0) + 1
+
+        ranked = [
+            (meal_id, count / self._sizes[meal_id])
+            for meal_id, count in counts.items()
+        ]
+        ranked.sort(key=lambda item: (-counts[item[0]], -item[1], item[0]))
+        return ranked
+
+
+def edit_distance(first, second, max_distance):
+    """Расстояние Левенштейна с ранним выходом при превышении порога"""
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (first_char != second_char)
+            ))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+
+    return previous[-1]
+
+
+def trigrams(text):
+    """Множество триграмм строки с отступами по краям слов"""
+    trigram_set = set()
+    for word in text.split():
+        padded = f"  {word} "
+        trigram_set.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigram_set
+
+
+class NameIndex:
+    """Триграммный индекс названий рецептов для нечеткого и префиксного поиска
+
+    Триграммы строятся по словарю слов из названий, поэтому расстояние
+    редактирования считается только для слов-кандидатов, а не для каждого
+    рецепта каталога.
+    """
+
+    def __init__(self, max_distance=FUZZY_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._word_postings = {}  # Триграмма -> слова словаря
+        self._word_meals = {}  # Слово -> ID рецептов
+        self._name_trigrams = {}  # ID рецепта -> триграммы названия
+
+    @classmethod
+    def build(cls, meals, max_distance=FUZZY_MAX_DISTANCE):
+        """Строит индекс по списку рецептов"""
+        index = cls(max_distance)
+        for meal in meals:
+            index.add(meal)
+        return index
+
+    def add(self, meal):
+        """Добавляет название рецепта (Meal) в индекс"""
+        meal_id = meal.id
+        name = normalize_term(meal.name)
+
+        for word in name.split():
+            if word not in self._word_meals:
+                self._word_meals[word] = set()
+                for trigram in trigrams(word):
+                    self._word_postings.setdefault(trigram, set()).add(word)
+            self._word_meals[word].add(meal_id)
+
+        self._name_trigrams[meal_id] = trigrams(name)
+
+    def _match_word(self, query_word):
+        """Для слова запроса находит рецепты и лучшее число правок в каждом"""
+        limit = min(self.max_distance, len(query_word) // 3)
+
+        candidates = set()
+        for trigram in trigrams(query_word):
+            candidates.update(self._word_postings.get(trigram, ()))
+
+        distances = {}
+        for word in candidates:
+            if word.startswith(query_word):
+                distance = 0
+            else:
+                distance = min(
+                    edit_distance(query_word, word, limit),
+                    edit_distance(query_word, word[:len(query_word)], limit)
+                )
+            if distance > limit:
+                continue
+
+            for meal_id in self._word_meals[word]:
+                if distance < distances.get(meal_id, limit + 1):
+                    distances[meal_id] = distance
+
+        return distances
+
+    def search(self, query, limit=10):
+        """Ищет названия, похожие на запрос
+
+        Каждое слово запроса должно совпадать со словом названия или его
+        началом с точностью до max_distance правок (для коротких слов
+        допуск меньше). Результат - список пар (ID рецепта, оценка), лучшие
+        совпадения первыми.
+        """
+        query = normalize_term(query)
+        query_words = query.split()
+        if not query_words:
+            return []
+
+        totals = None
+        for query_word in query_words:
+            distances = self._match_word(query_word)
+            if totals is None:
+                totals = distances
+            else:
+                totals = {
+                    meal_id: totals[meal_id] + distance
+                    for meal_id, distance in distances.items()
+                    if meal_id in totals
+                }
+            if not totals:
+                return []
+
+        query_trigrams = trigrams(query)
+        results = []
+        for meal_id, distance in totals.items():
+            name_trigrams = self._name_trigrams[meal_id]
+            common = len(query_trigrams & name_trigrams)
+            similarity = common / len(query_trigrams | name_trigrams)
+            results.append((meal_id, similarity - distance))
+
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
@@ -1,6 +1,7 @@
 import os
 import threading
-from flask import Flask
+from flask import Flask, Response, request
+from config import BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, UPDATE_WORKERS
 
 app = Flask(__name__)
 
@@ -9,19 +10,73 @@ _bot_thread = None
 
 def _run_bot_polling():
     from bot import bot as telegram_bot
+    # Polling не работает, пока у бота установлен вебхук
+    telegram_bot.remove_webhook()
     telegram_bot.infinity_polling()
 
 
+def _setup_webhook():
+    from bot import bot as telegram_bot
+    if not WEBHOOK_URL:
+        raise RuntimeError("Для режима webhook нужно задать WEBHOOK_URL")
+    if not WEBHOOK_SECRET:
+        # Без секрета любой может прислать поддельное обновление от имени любого чата
+        raise RuntimeError("Для режима webhook нужно задать WEBHOOK_SECRET")
+    telegram_bot.set_webhook(
+        url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=UPDATE_WORKERS,
+    )
+    print(f"🌐 Вебхук установлен: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+
 @app.route("/")
 def root():
     return "OK", 200
 
 
-if __name__ == "__main__":
+@app.route("/metrics")
+def metrics_endpoint():
+    from metrics import REGISTRY
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route(WEBHOOK_PATH, methods=["POST"])
+def webhook():
+    if not WEBHOOK_SECRET or request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return "Forbidden", 403
+
+    from telebot import types
+    try:
+        update = types.Update.de_json(request.get_data(as_text=True))
+    except (ValueError, KeyError, TypeError):
+        # Тело не JSON или не похоже на обновление Telegram
+        update = None
+    if update is None:
+        return "Bad Request", 400
+
+    from bot import bot as telegram_bot
+    # Очередь диспетчера переполнена - Telegram доставит обновление повторно позже
+    if not telegram_bot.dispatcher.submit(update, block=False):
+        return "Busy", 503
+    return "OK", 200
+
+
+def start_bot():
+    """Запускает получение обновлений в выбранном режиме (BOT_MODE)"""
+    global _bot_thread
+    if BOT_MODE == 'webhook':
+        _setup_webhook()
+        return
+
     # Start polling thread once at process start (Flask 3 removed before_first_request)
     if _bot_thread is None or not _bot_thread.is_alive():
         _bot_thread = threading.Thread(target=_run_bot_polling, daemon=True)
         _bot_thread.start()
 
+
+if __name__ == "__main__":
+    start_bot()
+
     port = int(os.getenv("PORT", "10000"))
     app.run(host="0.0.0.0", port=port)
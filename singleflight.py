@@ -0,0 +1,52 @@
+import threading
+
+
+class _Call:
+    """Выполняющийся запрос, результат которого ждут остальные вызывающие"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединяет одновременные вызовы с одинаковым ключом в один
+
+    Первый вызывающий выполняет функцию, остальные ждут и получают тот же
+    результат (или то же исключение).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0  # Сколько вызовов получили чужой результат
+
+    def do(self, key, func, *args, **kwargs):
+        """Выполняет func или ждет уже выполняющийся вызов с тем же ключом"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                is_leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                is_leader = True
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
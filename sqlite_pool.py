@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import weakref
+from config import SQLITE_BUSY_TIMEOUT, SQLITE_CACHED_STATEMENTS
+
+
+class ConnectionPool:
+    """Постоянные соединения SQLite: по одному на каждый поток
+
+    Соединения открываются в режиме WAL, поэтому читатели не блокируют
+    писателя, а кэш подготовленных выражений живет столько же, сколько
+    поток, и переиспользуется между вызовами. Соединение закрывается, когда
+    завершившийся поток удаляется сборщиком мусора.
+    """
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def connection(self):
+        """Соединение текущего потока (создается при первом обращении)
+
+        Используется как `with pool.connection() as conn:` - контекстный
+        менеджер sqlite3 фиксирует или откатывает транзакцию, но не
+        закрывает соединение.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+            weakref.finalize(threading.current_thread(), self._release, conn)
+        return conn
+
+    def _release(self, conn):
+        """Закрывает соединение завершившегося потока"""
+        with self._lock:
+            try:
+                self._connections.remove(conn)
+            except ValueError:
+                return  # Уже закрыто в close_all
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+            check_same_thread=False
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}')
+        return conn
+
+    def close_all(self):
+        """Закрывает все открытые соединения"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name):
+    """Общий пул соединений для файла базы данных"""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ConnectionPool(db_name)
+        return pool
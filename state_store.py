@@ -0,0 +1,239 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from cache import LRUCache
+from config import DATABASE_NAME, STATE_BACKEND, STATE_MAX_ENTRIES, STATE_FLUSH_INTERVAL
+from sqlite_pool import get_pool
+
+# Отметка об удалении ключа в буфере отложенной записи
+_DELETED = object()
+
+
+class StateStore(ABC):
+    """Общий словарный интерфейс хранилищ состояний пользователей
+
+    Наследники реализуют get, set и delete; ключи - id чатов.
+    """
+
+    @abstractmethod
+    def get(self, key, default=None):
+        """Значение по ключу или default"""
+
+    @abstractmethod
+    def set(self, key, value):
+        """Сохраняет значение"""
+
+    @abstractmethod
+    def delete(self, key):
+        """Удаляет значение"""
+
+    def flush(self):
+        """Записывает отложенные изменения (если они есть)"""
+
+    def __getitem__(self, key):
+        value = self.get(key, _DELETED)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+    def __contains__(self, key):
+        return self.get(key, _DELETED) is not _DELETED
+
+
+class MemoryStateStore(StateStore):
+    """Состояние пользователей в памяти процесса
+
+    Записи живут ttl секунд после последнего изменения, при переполнении
+    вытесняются давно не использованные, поэтому память не растет с числом
+    чатов. Состояние теряется при перезапуске.
+    """
+
+    def __init__(self, ttl, max_entries=STATE_MAX_ENTRIES):
+        self.ttl = ttl
+        self._entries = LRUCache(max_entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else default
+
+    def set(self, key, value):
+        self._entries.set(key, value, time.time() + self.ttl)
+
+    def delete(self, key):
+        self._entries.delete(key)
+
+
+class SQLiteStateStore(StateStore):
+    """Состояние пользователей в базе данных бота с отложенной записью
+
+    Изменения сначала попадают в буфер и раз в STATE_FLUSH_INTERVAL секунд
+    записываются в базу одной транзакцией, поэтому обработчики не ждут
+    диска. Состояние переживает перезапуск и доступно всем процессам,
+    работающим с той же базой (с задержкой не больше интервала записи).
+    При write_through=True set и delete записывают изменения сразу: так
+    хранятся данные, которые другой процесс может прочитать немедленно.
+    """
+
+    PURGE_INTERVAL = 60 * 60  # Удаление просроченных записей (в секундах)
+
+    def __init__(self, namespace, ttl, db_name=DATABASE_NAME, flush_interval=STATE_FLUSH_INTERVAL,
+                 write_through=False):
+        self.namespace = namespace
+        self.write_through = write_through
+        self.ttl = ttl
+        self.db_name = db_name
+        self.pool = get_pool(self.db_name)
+        self.flush_interval = flush_interval
+        self._pending = {}  # Еще не записанные изменения: ключ -> (значение, срок)
+        self._flushing = {}  # Изменения, которые записываются прямо сейчас
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_purge = 0.0
+        self.init_table()
+        self._flusher = threading.Thread(target=self._flush_loop, name=f'state-{namespace}', daemon=True)
+        self._flusher.start()
+
+    def init_table(self):
+        """Создание таблицы состояний пользователей"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS session_state (
+                        namespace TEXT NOT NULL,
+                        state_key TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        PRIMARY KEY (namespace, state_key)
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка инициализации хранилища состояний: {e}")
+
+    def get(self, key, default=None):
+        key = str(key)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._flushing.get(key)
+
+        if entry is None:
+            entry = self._load(key)
+        if entry is None or entry is _DELETED or entry[1] <= time.time():
+            return default
+        return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._pending[str(key)] = (value, time.time() + self.ttl)
+        if self.write_through:
+            self.flush()
+
+    def delete(self, key):
+        with self._lock:
+            self._pending[str(key)] = _DELETED
+        if self.write_through:
+            self.flush()
+
+    def _load(self, key):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT value, expires_at FROM session_state
+                    WHERE namespace = ? AND state_key = ?
+                ''', (self.namespace, key))
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка чтения состояния пользователя: {e}")
+            return None
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError as e:
+            print(f"❌ Поврежденное состояние {self.namespace}/{key}: {e}")
+            return None
+
+    def flush(self):
+        """Записывает накопленные изменения в базу"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._flushing, self._pending = self._pending, {}
+
+            updates = []
+            deletes = []
+            for key, entry in self._flushing.items():
+                if entry is _DELETED:
+                    deletes.append((self.namespace, key))
+                    continue
+                try:
+                    updates.append((self.namespace, key, json.dumps(entry[0], ensure_ascii=False), entry[1]))
+                except (TypeError, ValueError) as e:
+                    # Несериализуемое значение не должно останавливать запись остальных
+                    print(f"❌ Состояние {self.namespace}/{key} не сохранено: {e}")
+
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany('''
+                        INSERT OR REPLACE INTO session_state (namespace, state_key, value, expires_at)
+                        VALUES (?, ?, ?, ?)
+                    ''', updates)
+                    cursor.executemany(
+                        'DELETE FROM session_state WHERE namespace = ? AND state_key = ?', deletes
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                print(f"❌ Ошибка записи состояний пользователей: {e}")
+                # Возвращаем изменения в буфер, не затирая более новые
+                with self._lock:
+                    for key, entry in self._flushing.items():
+                        self._pending.setdefault(key, entry)
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def purge_expired(self):
+        """Удаляет просроченные состояния"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM session_state WHERE namespace = ? AND expires_at <= ?
+                ''', (self.namespace, time.time()))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка очистки состояний пользователей: {e}")
+            return 0
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.time() - self._last_purge > self.PURGE_INTERVAL:
+                    self.purge_expired()
+                    self._last_purge = time.time()
+            except Exception as e:
+                # Поток записи не должен завершаться: иначе изменения останутся только в памяти
+                print(f"❌ Ошибка фоновой записи состояний: {e}")
+
+
+def create_state_store(namespace, ttl, backend=STATE_BACKEND, write_through=False):
+    """Хранилище состояний выбранного типа: 'memory' или 'sqlite'"""
+    if backend == 'sqlite':
+        return SQLiteStateStore(namespace, ttl, write_through=write_through)
+    return MemoryStateStore(ttl)
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Скрипт для синхронизации локального зеркала каталога TheMealDB
+"""
+
+from api_client import TheMealDBClient
+from catalog import MealCatalog
+
+def sync_catalog():
+    """Загружает весь каталог TheMealDB в локальную базу данных"""
+    catalog = MealCatalog()
+    
+    with TheMealDBClient() as client:
+        changes = catalog.sync(client)
+    
+    print(f"📊 Рецептов в зеркале: {len(catalog)}")
+    return changes
+
+if __name__ == "__main__":
+    print("📚 Синхронизация каталога рецептов...")
+    sync_catalog()
+    print("✅ Синхронизация завершена!")
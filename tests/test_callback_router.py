@@ -0,0 +1,102 @@
+import pytest
+from callback_router import CALLBACK_DATA_LIMIT, CALLBACK_PREFIX, CallbackRouter
+from state_store import MemoryStateStore
+
+
+@pytest.fixture
+def router():
+    return CallbackRouter(tokens=MemoryStateStore(60))
+
+
+def test_route_without_params_stays_plain_name(router):
+    assert router.encode('my_recipes') == 'my_recipes'
+    route, args = router.resolve('my_recipes')
+    assert route.name == 'my_recipes'
+    assert args == ()
+
+
+@pytest.mark.parametrize('name, args', [
+    ('save_recipe', ('52772',)),
+    ('category', ('Миска',)),
+    ('set_rating', ('52_772', 5)),
+    ('set_rating', ('52772', -3)),
+])
+def test_encode_resolve_round_trip(router, name, args):
+    data = router.encode(name, *args)
+    assert data.startswith(CALLBACK_PREFIX)
+    assert len(data.encode('utf-8')) <= CALLBACK_DATA_LIMIT
+    route, decoded = router.resolve(data)
+    assert route.name == name
+    assert decoded == args
+
+
+def test_long_args_spill_into_token(router):
+    category = 'Очень длинное название категории ' * 3
+    data = router.encode('category', category)
+    assert len(data.encode('utf-8')) <= CALLBACK_DATA_LIMIT
+    route, args = router.resolve(data)
+    assert route.name == 'category'
+    assert args == (category,)
+
+
+def test_expired_spilled_token_resolves_without_args(router):
+    data = router.encode('category', 'x' * 100)
+    router.tokens = MemoryStateStore(60)
+    route, args = router.resolve(data)
+    assert route.name == 'category'
+    assert args is None
+
+
+def test_token_param_round_trip_and_expiry(router):
+    cursor = [5, '2024-01-01 12:00:00', 17]
+    data = router.encode('show_more_favorites', cursor, 10)
+    route, args = router.resolve(data)
+    assert route.name == 'show_more_favorites'
+    assert args == (cursor, 10)
+
+    router.tokens = MemoryStateStore(60)
+    route, args = router.resolve(data)
+    assert route.name == 'show_more_favorites'
+    assert args is None
+
+
+@pytest.mark.parametrize('data, name, args', [
+    ('save_recipe_52772', 'save_recipe', ('52772',)),
+    ('set_rating_52772_4', 'set_rating', ('52772', 4)),
+    ('set_rating_52_772_4', 'set_rating', ('52_772', 4)),
+    ('remove_fav_52772', 'remove_fav', ('52772',)),
+    ('show_more_favorites', 'show_more_favorites', ()),
+])
+def test_legacy_strings(router, data, name, args):
+    route, decoded = router.resolve(data)
+    assert route.name == name
+    assert decoded == args
+
+
+def test_legacy_string_with_bad_params(router):
+    route, args = router.resolve('set_rating_52772_x')
+    assert route.name == 'set_rating'
+    assert args is None
+
+
+@pytest.mark.parametrize('data', ['', 'unknown_button', '~', '~!!!', '~AQ', '~AX8'])
+def test_unknown_data(router, data):
+    assert router.resolve(data) == (None, None)
+
+
+def test_truncated_data(router):
+    data = router.encode('set_rating', '52772', 4)
+    for end in range(len(CALLBACK_PREFIX) + 1, len(data)):
+        assert router.resolve(data[:end]) == (None, None)
+
+
+def test_handler_registration(router):
+    @router.handler('save_recipe')
+    def save(chat_id, meal_id):
+        return chat_id, meal_id
+
+    route, args = router.resolve(router.encode('save_recipe', '1'))
+    assert router.handler_for(route)(7, *args) == (7, '1')
+    assert router.handler_for(None) is None
+    with pytest.raises(KeyError):
+        router.handler('no_such_route')
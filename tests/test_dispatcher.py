@@ -0,0 +1,113 @@
+import threading
+import time
+from telebot import types
+from dispatcher import ChatDispatcher, update_chat_key
+
+
+def make_update(update_id, chat_id):
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': str(update_id),
+        },
+    })
+
+
+class BlockingHandler:
+    """Обработчик, который ждет разрешения и запоминает обновления"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.handled = []
+        self._lock = threading.Lock()
+
+    def __call__(self, update):
+        self.started.release()
+        self.release.wait(5)
+        with self._lock:
+            self.handled.append(update.update_id)
+
+
+def wait_handled(dispatcher, timeout=5):
+    """Ждет, пока диспетчер обработает все обновления"""
+    deadline = time.monotonic() + timeout
+    while dispatcher.depth():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_update_chat_key():
+    assert update_chat_key(make_update(1, 42)) == 42
+    assert update_chat_key(types.Update.de_json({'update_id': 7})) == ('update', 7)
+
+
+def test_rejects_when_full_without_blocking():
+    handler = BlockingHandler()
+    dispatcher = ChatDispatcher(handler, workers=1, max_pending=2, max_pending_per_chat=10)
+
+    assert dispatcher.submit(make_update(1, 1), block=False)
+    assert handler.started.acquire(timeout=5)
+    assert dispatcher.submit(make_update(2, 2), block=False)
+    assert not dispatcher.submit(make_update(3, 3), block=False)
+    assert not dispatcher.submit(make_update(4, 4), timeout=0.05)
+    assert dispatcher.depth() == 2
+
+    handler.release.set()
+    assert wait_handled(dispatcher)
+    assert sorted(handler.handled) == [1, 2]
+
+
+def test_blocked_submit_resumes_when_space_frees():
+    handler = BlockingHandler()
+    dispatcher = ChatDispatcher(handler, workers=1, max_pending=1, max_pending_per_chat=10)
+    dispatcher.submit(make_update(1, 1))
+    assert handler.started.acquire(timeout=5)
+
+    accepted = []
+    submitter = threading.Thread(target=lambda: accepted.append(dispatcher.submit(make_update(2, 2))))
+    submitter.start()
+    submitter.join(0.1)
+    assert submitter.is_alive()
+
+    handler.release.set()
+    submitter.join(5)
+    assert accepted == [True]
+    assert wait_handled(dispatcher)
+    assert handler.handled == [1, 2]
+
+
+def test_chat_flood_is_dropped():
+    handler = BlockingHandler()
+    dispatcher = ChatDispatcher(handler, workers=2, max_pending=100, max_pending_per_chat=3)
+    for update_id in range(1, 6):
+        assert dispatcher.submit(make_update(update_id, 1), block=False)
+    assert dispatcher.submit(make_update(6, 2), block=False)
+
+    handler.release.set()
+    assert wait_handled(dispatcher)
+    assert sorted(handler.handled) == [1, 2, 3, 6]
+
+
+def test_chat_updates_are_handled_in_order():
+    handled = []
+    lock = threading.Lock()
+
+    def handler(update):
+        with lock:
+            handled.append((update_chat_key(update), update.update_id))
+
+    dispatcher = ChatDispatcher(handler, workers=4, max_pending=100, max_pending_per_chat=100)
+    for update_id in range(40):
+        dispatcher.submit(make_update(update_id, update_id % 3))
+
+    assert wait_handled(dispatcher)
+    for chat_id in range(3):
+        ids = [update_id for chat, update_id in handled if chat == chat_id]
+        assert ids == sorted(ids)
+        assert len(ids) == len(range(chat_id, 40, 3))
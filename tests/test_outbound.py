@@ -0,0 +1,106 @@
+import threading
+import time
+import pytest
+from outbound import OutboundQueue, TokenBucket, get_retry_after
+
+FAST = dict(per_chat_rate=1000, per_chat_burst=1000, global_rate=1000, global_burst=1000)
+
+
+class TooManyRequests(Exception):
+    """Ошибка 429 в том виде, в каком ее выбрасывает telebot"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too Many Requests')
+        self.error_code = 429
+        self.result_json = {'parameters': {'retry_after': retry_after}}
+
+
+class Recorder:
+    """Функция отправки, которая запоминает порядок и один раз отвечает 429"""
+
+    def __init__(self, fail_on=None, retry_after=0.1):
+        self.sent = []
+        self.fail_on = set(fail_on or ())
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+
+    def __call__(self, chat_id, number):
+        with self._lock:
+            if (chat_id, number) in self.fail_on:
+                self.fail_on.discard((chat_id, number))
+                raise TooManyRequests(self.retry_after)
+            self.sent.append((chat_id, number, time.monotonic()))
+        return number
+
+
+def sent_to(recorder, chat_id):
+    return [number for chat, number, _ in recorder.sent if chat == chat_id]
+
+
+def test_get_retry_after():
+    assert get_retry_after(TooManyRequests(3)) == 3
+    assert get_retry_after(ValueError()) is None
+
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(rate=10, capacity=1)
+    now = time.monotonic()
+    assert bucket.delay(now) == 0
+    bucket.consume(now)
+    assert bucket.delay(now) == pytest.approx(0.1, abs=0.01)
+
+
+def test_chat_order_is_kept_after_429():
+    queue = OutboundQueue(**FAST)
+    recorder = Recorder(fail_on={(1, 0)})
+    futures = [queue.submit(1, recorder, 1, number) for number in range(5)]
+
+    assert [future.result(timeout=5) for future in futures] == list(range(5))
+    assert sent_to(recorder, 1) == list(range(5))
+
+
+def test_group_429_does_not_pause_other_chats():
+    queue = OutboundQueue(**FAST)
+    recorder = Recorder(fail_on={(-100, 0)}, retry_after=0.3)
+    group = queue.submit(-100, recorder, -100, 0)
+    time.sleep(0.05)
+    private = queue.submit(2, recorder, 2, 0)
+
+    private.result(timeout=5)
+    group.result(timeout=5)
+    assert [chat for chat, _, _ in recorder.sent] == [2, -100]
+
+
+def test_bot_wide_429_pauses_all_chats():
+    queue = OutboundQueue(**FAST)
+    recorder = Recorder(fail_on={(1, 0)}, retry_after=0.3)
+    start = time.monotonic()
+    first = queue.submit(1, recorder, 1, 0)
+    time.sleep(0.05)
+    other = queue.submit(2, recorder, 2, 0)
+
+    other.result(timeout=5)
+    first.result(timeout=5)
+    sent_at = {chat: at for chat, _, at in recorder.sent}
+    assert sent_at[2] - start >= 0.25
+
+
+def test_gives_up_after_max_retries():
+    queue = OutboundQueue(**FAST)
+
+    def always_limited():
+        raise TooManyRequests(0.01)
+
+    with pytest.raises(TooManyRequests):
+        queue.submit(1, always_limited).result(timeout=5)
+
+
+def test_unthrottled_request_skips_busy_queue():
+    queue = OutboundQueue(per_chat_rate=1000, per_chat_burst=1000, global_rate=2, global_burst=1)
+    for number in range(5):
+        queue.submit(number, time.sleep, 0)
+
+    start = time.monotonic()
+    queue.submit_unthrottled(time.sleep, 0).result(timeout=5)
+    assert time.monotonic() - start < 0.5
+    assert queue.wait_idle(timeout=5)
@@ -0,0 +1,95 @@
+import sqlite3
+from unittest import mock
+import pytest
+import fix_database
+from recipe_codec import CODECS, JsonCodec, compact_recipe, decode_recipe, encode_recipe
+
+RECIPE = {
+    'idMeal': '52772',
+    'strMeal': 'Teriyaki Chicken Casserole',
+    'strCategory': 'Chicken',
+    'strArea': 'Japanese',
+    'strInstructions': 'Preheat the oven to 180C. Add the sauce and bake for 20 minutes.',
+    'strMealThumb': 'https://www.themealdb.com/images/media/meals/wvpsxx1468256321.jpg',
+    'strYoutube': 'https://www.youtube.com/watch?v=4aZr5hZXP_s',
+    'strTags': None,
+    'strSource': '',
+    'strIngredient1': 'soy sauce',
+    'strMeasure1': '3/4 cup',
+    'strIngredient2': 'Ёжик',
+    'strMeasure2': ' ',
+}
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+def test_round_trip(name):
+    decoded = decode_recipe(encode_recipe(RECIPE, name))
+    expected = RECIPE if name == 'json' else compact_recipe(RECIPE)
+    assert decoded == expected
+
+
+def test_compact_recipe_drops_empty_fields():
+    compacted = compact_recipe(RECIPE)
+    assert 'strTags' not in compacted
+    assert 'strSource' not in compacted
+    assert 'strMeasure2' not in compacted
+    assert compacted['strIngredient2'] == 'Ёжик'
+
+
+def test_legacy_json_string_is_decoded():
+    legacy = JsonCodec().encode(RECIPE)
+    assert isinstance(legacy, str)
+    assert decode_recipe(legacy) == RECIPE
+
+
+def test_compressed_payload_is_smaller_than_json():
+    assert len(encode_recipe(RECIPE, 'zlib_dict')) < len(JsonCodec().encode(RECIPE).encode('utf-8'))
+
+
+@pytest.mark.parametrize('payload', [b'', b'\x09abc', b'\x01not zlib', b'\x02not zlib'])
+def test_corrupt_payload_raises_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_recipe(payload)
+
+
+def _create_legacy_favorites(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE favorites (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                recipe_id TEXT NOT NULL,
+                recipe_name TEXT NOT NULL,
+                recipe_data TEXT NOT NULL,
+                saved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        legacy = JsonCodec().encode(RECIPE)
+        conn.executemany(
+            'INSERT INTO favorites (user_id, recipe_id, recipe_name, recipe_data) VALUES (?, ?, ?, ?)',
+            [(1, '52772', RECIPE['strMeal'], legacy), (2, '52772', RECIPE['strMeal'], legacy)]
+        )
+
+
+def test_migrate_and_compress_legacy_favorites(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    _create_legacy_favorites(db_path)
+
+    with mock.patch.object(fix_database, 'DATABASE_NAME', db_path), \
+            mock.patch.object(fix_database, 'RECIPE_CODEC', 'zlib_dict'):
+        fix_database.migrate_recipe_data()
+        fix_database.compress_recipe_data()
+        # Повторный запуск ничего не меняет
+        fix_database.migrate_recipe_data()
+        fix_database.compress_recipe_data()
+
+    with sqlite3.connect(db_path) as conn:
+        favorites = conn.execute('SELECT recipe_data FROM favorites').fetchall()
+        recipes = conn.execute('SELECT recipe_id, recipe_data FROM recipes').fetchall()
+
+    assert favorites == [('',), ('',)]
+    assert len(recipes) == 1
+    recipe_id, payload = recipes[0]
+    assert recipe_id == '52772'
+    assert isinstance(payload, bytes)
+    assert decode_recipe(payload) == compact_recipe(RECIPE)